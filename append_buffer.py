@@ -0,0 +1,116 @@
+import threading
+import time
+from concurrent.futures import Future, wait
+import config
+
+class BufferedAppender:
+    """Groups small record appends per file into batched record appends.
+
+    append() returns a Future that resolves to the offset of the record in the
+    file, or to None if the batch holding it could not be appended. A batch is
+    submitted once it reaches max_batch_bytes or its oldest record has waited
+    max_delay seconds. Batches are submitted one at a time by a background
+    thread, so records of the same file keep their order. Records may be str
+    or bytes; str records are stored UTF-8 encoded.
+    """
+
+    def __init__(self, client, max_batch_bytes=config.APPEND_BATCH_MAX_BYTES,
+                 max_delay=config.APPEND_BATCH_MAX_DELAY_SECONDS):
+        self.client = client
+        self.max_batch_bytes = min(max_batch_bytes, config.CHUNK_SIZE_BYTES)
+        self.max_delay = max_delay
+        self.cond = threading.Condition()
+        self.pending = {}
+        self.pending_bytes = {}
+        self.deadlines = {}
+        self.ready = []
+        self.in_flight = set()
+        self.closed = False
+        self.flusher = threading.Thread(target=self._run, daemon=True)
+        self.flusher.start()
+
+    def append(self, filename, data):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        future = Future()
+        with self.cond:
+            if self.closed:
+                raise ValueError("append() on a closed BufferedAppender")
+            if filename in self.pending and self.pending_bytes[filename] + len(data) > self.max_batch_bytes:
+                self._seal(filename)
+            if filename not in self.pending:
+                self.pending[filename] = []
+                self.pending_bytes[filename] = 0
+                self.deadlines[filename] = time.monotonic() + self.max_delay
+            self.pending[filename].append((data, future))
+            self.pending_bytes[filename] += len(data)
+            if self.pending_bytes[filename] >= self.max_batch_bytes:
+                self._seal(filename)
+            self.cond.notify()
+        return future
+
+    def _seal(self, filename):
+        batch = self.pending.pop(filename)
+        del self.pending_bytes[filename]
+        del self.deadlines[filename]
+        self.ready.append((filename, batch))
+        self.in_flight.update(future for _, future in batch)
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while not self.ready:
+                    if self.closed and not self.pending:
+                        return
+                    now = time.monotonic()
+                    for filename in [f for f, deadline in self.deadlines.items() if deadline <= now]:
+                        self._seal(filename)
+                    if not self.ready:
+                        timeout = min(self.deadlines.values()) - now if self.deadlines else None
+                        self.cond.wait(timeout)
+                filename, batch = self.ready.pop(0)
+            self._submit(filename, batch)
+
+    def _submit(self, filename, batch):
+        try:
+            offset = self.client.record_append(filename, b''.join(data for data, _ in batch))
+        except Exception as e:
+            # The flusher must outlive a failed batch, or flush() would wait forever.
+            print(f"Error appending a batch to {filename}: {e}")
+            offset = None
+        for data, future in batch:
+            future.set_result(offset)
+            if offset is not None:
+                offset += len(data)
+        with self.cond:
+            self.in_flight.difference_update(future for _, future in batch)
+
+    def flush(self):
+        """Submits every buffered record and waits until all of them are appended.
+
+        Returns True if every record waited on made it into its file.
+        """
+        with self.cond:
+            for filename in list(self.pending):
+                self._seal(filename)
+            futures = list(self.in_flight)
+            self.cond.notify()
+        wait(futures)
+        return all(future.result() is not None for future in futures)
+
+    def close(self):
+        with self.cond:
+            if self.closed:
+                return True
+            self.closed = True
+        durable = self.flush()
+        with self.cond:
+            self.cond.notify()
+        self.flusher.join()
+        return durable
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
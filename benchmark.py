@@ -0,0 +1,173 @@
+import argparse
+import json
+import os
+import tempfile
+import time
+import multiprocessing
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from metadata import ChunkTable, FileRecord, save_checkpoint, load_checkpoint
+from client import GFSClient
+
+SERVERS = [f"127.0.0.1:{port}" for port in range(50053, 50073)]
+
+def build_compact_metadata(num_chunks, chunks_per_file, replication):
+    files = {}
+    chunks = ChunkTable()
+    placements = [[SERVERS[(start + i) % len(SERVERS)] for i in range(replication)] for start in range(len(SERVERS))]
+    for handle in range(num_chunks):
+        file_index, chunk_index = divmod(handle, chunks_per_file)
+        if chunk_index == 0:
+            record = files[f"/bench/file_{file_index}"] = FileRecord('replicated', time.time())
+        chunks.allocate(placements[handle % len(SERVERS)])
+        record.set_chunk(chunk_index, handle)
+    return files, chunks
+
+def build_legacy_metadata(num_chunks, chunks_per_file, replication):
+    # The nested-dict layout GFSMaster used before the compact representation.
+    files, chunks, file_to_chunks = {}, {}, {}
+    for handle in range(num_chunks):
+        file_index, chunk_index = divmod(handle, chunks_per_file)
+        filename = f"/bench/file_{file_index}"
+        if chunk_index == 0:
+            files[filename] = {'length': 0, 'chunks': {}}
+            file_to_chunks[filename] = []
+        start = handle % len(SERVERS)
+        chunks[str(handle)] = {'replicas': [SERVERS[(start + i) % len(SERVERS)] for i in range(replication)], 'version': 0}
+        files[filename]['chunks'][str(chunk_index)] = str(handle)
+        file_to_chunks[filename].append(str(handle))
+    return {'files': files, 'chunks': chunks, 'file_to_chunks': file_to_chunks, 'next_chunk_handle': num_chunks}
+
+def measure(build, *args):
+    tracemalloc.start()
+    result = build(*args)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size
+
+def bench_metadata(args):
+    with tempfile.TemporaryDirectory() as workdir:
+        legacy, legacy_bytes = measure(build_legacy_metadata, args.legacy_chunks, args.chunks_per_file, args.replication)
+        legacy_path = os.path.join(workdir, 'legacy.json')
+        with open(legacy_path, 'w') as f:
+            json.dump(legacy, f)
+        del legacy
+        start = time.perf_counter()
+        with open(legacy_path, 'r') as f:
+            json.load(f)
+        legacy_load = time.perf_counter() - start
+
+        (files, chunks), compact_bytes = measure(build_compact_metadata, args.chunks, args.chunks_per_file, args.replication)
+        checkpoint_path = os.path.join(workdir, 'checkpoint.db')
+        start = time.perf_counter()
+        save_checkpoint(checkpoint_path, files, chunks)
+        save_time = time.perf_counter() - start
+        checkpoint_size = os.path.getsize(checkpoint_path)
+        del files, chunks
+        start = time.perf_counter()
+        load_checkpoint(checkpoint_path)
+        compact_load = time.perf_counter() - start
+
+    print(f"legacy dicts + JSON  ({args.legacy_chunks:>11,} chunks): "
+          f"{legacy_bytes / args.legacy_chunks:8.1f} bytes/chunk, cold start {legacy_load:7.3f}s "
+          f"({legacy_load / args.legacy_chunks * 1e6:.2f} us/chunk)")
+    print(f"compact + checkpoint ({args.chunks:>11,} chunks): "
+          f"{compact_bytes / args.chunks:8.1f} bytes/chunk, cold start {compact_load:7.3f}s "
+          f"({compact_load / args.chunks * 1e6:.2f} us/chunk)")
+    print(f"checkpoint: {checkpoint_size / args.chunks:.1f} bytes/chunk on disk, written in {save_time:.3f}s")
+
+def bench_append(args):
+    # Runs against a live cluster (see run_simulation.sh).
+    client = GFSClient()
+    record = "x" * (args.record_size - 1) + "\n"
+    suffix = int(time.time())
+
+    filename = f"/bench/append_unbuffered_{suffix}"
+    client.create(filename)
+    start = time.perf_counter()
+    for _ in range(args.unbuffered_records):
+        client.append(filename, record)
+    unbuffered = args.unbuffered_records / (time.perf_counter() - start)
+
+    filename = f"/bench/append_buffered_{suffix}"
+    client.create(filename)
+    start = time.perf_counter()
+    with client.buffered_appender() as appender:
+        futures = [appender.append(filename, record) for _ in range(args.records)]
+    buffered = args.records / (time.perf_counter() - start)
+    failed = sum(1 for future in futures if future.result() is None)
+
+    print(f"GFSClient.append:  {unbuffered:10.1f} records/s ({args.unbuffered_records} records of {args.record_size} bytes)")
+    print(f"BufferedAppender:  {buffered:10.1f} records/s ({args.records} records, {failed} failed)")
+
+def percentile(ordered, p):
+    return ordered[min(len(ordered) - 1, len(ordered) * p // 100)]
+
+def saturate(port, chunk_handle, stop):
+    while not stop.is_set():
+        requests.get(f"http://127.0.0.1:{port}/read", params={'chunk_handle': chunk_handle})
+
+def bench_read(args):
+    # Runs against a live cluster with REPLICATION_FACTOR >= 2; hedging needs a second replica.
+    filename = f"/bench/read_{int(time.time())}"
+    writer = GFSClient()
+    writer.create(filename)
+    writer.write(filename, "x" * args.read_size)
+    time.sleep(1)
+
+    # Optional background readers saturate one replica to make it the slow one.
+    stop = multiprocessing.Event()
+    locations = writer._get_chunk_locations(filename, 0)
+    for _ in range(args.background_readers):
+        multiprocessing.Process(target=saturate, args=(locations['locations'][0], locations['chunk_handle'], stop), daemon=True).start()
+
+    for hedge_reads in (False, True):
+        client = GFSClient(hedge_reads=hedge_reads)
+
+        def timed_read(_):
+            start = time.perf_counter()
+            ok = client.read(filename, 0, args.read_size) is not None
+            return time.perf_counter() - start, ok
+
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            results = list(pool.map(timed_read, range(args.reads)))
+        latencies = sorted(latency for latency, _ in results)
+        failed = sum(1 for _, ok in results if not ok)
+        stats = client.replica_selector.stats()
+        print(f"{'hedged' if hedge_reads else 'unhedged':>8}: p50 {percentile(latencies, 50) * 1000:7.2f} ms, "
+              f"p99 {percentile(latencies, 99) * 1000:7.2f} ms, max {latencies[-1] * 1000:7.2f} ms "
+              f"({args.reads} reads, {failed} failed, {stats['hedges']} hedged, {stats['hedge_wins']} won by the hedge)")
+    stop.set()
+
+def main():
+    parser = argparse.ArgumentParser(description="GFS benchmark scenarios")
+    scenarios = parser.add_subparsers(dest='scenario', required=True)
+
+    metadata = scenarios.add_parser('metadata', help="master memory per chunk and cold-start time")
+    metadata.add_argument('--chunks', type=int, default=10_000_000)
+    metadata.add_argument('--legacy-chunks', type=int, default=200_000,
+                          help="chunks for the nested-dict baseline, which is too large to build at full scale")
+    metadata.add_argument('--chunks-per-file', type=int, default=1000)
+    metadata.add_argument('--replication', type=int, default=3)
+    metadata.set_defaults(run=bench_metadata)
+
+    append = scenarios.add_parser('append', help="small-record append throughput against a running cluster")
+    append.add_argument('--records', type=int, default=100_000)
+    append.add_argument('--unbuffered-records', type=int, default=500)
+    append.add_argument('--record-size', type=int, default=100)
+    append.set_defaults(run=bench_append)
+
+    read = scenarios.add_parser('read', help="read tail latency with and without hedged reads against a running cluster")
+    read.add_argument('--reads', type=int, default=2000)
+    read.add_argument('--concurrency', type=int, default=8)
+    read.add_argument('--read-size', type=int, default=4096)
+    read.add_argument('--background-readers', type=int, default=0,
+                      help="processes hammering the first replica to slow it down")
+    read.set_defaults(run=bench_read)
+
+    args = parser.parse_args()
+    args.run(args)
+
+if __name__ == '__main__':
+    main()
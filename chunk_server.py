@@ -4,30 +4,43 @@ import time
 import requests
 import threading
 import json
+import base64
+import zlib
 from flask import Flask, request, jsonify
 import config
+import compression
+import chunk_storage
 
 app = Flask(__name__)
 
 class GFSChunkServer:
-    def __init__(self, port, data_dir):
+    def __init__(self, port, data_dir, codec=config.CHUNK_COMPRESSION, storage_backend=config.CHUNK_STORAGE_BACKEND):
         self.port = port
         self.data_dir = data_dir
+        self.codec = compression.validate_codec(codec)
         self.server_id = None
         self.master_url = f"http://{config.MASTER_HOST}:{config.MASTER_PORT}"
         self.chunks = {}
         self.lock = threading.Lock()
         self.op_queue = []
         self.processed_requests = set()
+        # Leases this server holds as primary (handle -> expiry) and when each chunk was last mutated.
+        self.leases = {}
+        self.mutation_times = {}
+        self.stats_lock = threading.Lock()
+        self.compression_stats = {'compress_cpu_seconds': 0.0, 'decompress_cpu_seconds': 0.0}
+        self.active_reads = 0
 
         if not os.path.exists(self.data_dir):
             os.makedirs(self.data_dir)
 
+        self.store = chunk_storage.create_store(storage_backend, self.data_dir)
         self.load_metadata()
 
         threading.Thread(target=self.register_with_master, daemon=True).start()
         threading.Thread(target=self.send_heartbeat, daemon=True).start()
         threading.Thread(target=self.process_op_queue, daemon=True).start()
+        threading.Thread(target=self.compact_storage, daemon=True).start()
 
     def load_metadata(self):
         metadata_path = os.path.join(self.data_dir, 'chunk_metadata.json')
@@ -60,15 +73,56 @@ class GFSChunkServer:
         while True:
             if self.server_id:
                 try:
-                    chunk_report = list(self.chunks.keys())
-                    requests.post(f"{self.master_url}/heartbeat", json={
-                        'server_id': self.server_id,
-                        'chunk_report': chunk_report
-                    })
+                    response = requests.post(f"{self.master_url}/heartbeat", json=self.build_heartbeat())
+                    if response.status_code == 200:
+                        self.apply_heartbeat_response(response.json())
                 except requests.exceptions.ConnectionError:
                     print("Master not available.")
             time.sleep(config.HEARTBEAT_INTERVAL_SECONDS)
 
+    def load(self):
+        # Reported to the master and to readers, who steer reads to less busy replicas.
+        return self.active_reads + len(self.op_queue)
+
+    def build_heartbeat(self):
+        now = time.time()
+        # Leases on chunks that are still being mutated are extended with the
+        # heartbeat instead of separate requests; idle leases are left to lapse.
+        active_since = now - config.LEASE_TIME_SECONDS
+        return {
+            'server_id': self.server_id,
+            'load': self.load(),
+            'chunk_report': {handle: meta.get('version', 0) for handle, meta in list(self.chunks.items())},
+            'lease_extensions': [handle for handle, expiry in list(self.leases.items())
+                                 if expiry > now and self.mutation_times.get(handle, 0) > active_since]
+        }
+
+    def apply_heartbeat_response(self, body):
+        if body.get('status') == 're-register':
+            # The master restarted or declared this server dead. Leases it
+            # granted before are gone; registering again brings the chunk
+            # report back with the next heartbeat.
+            self.server_id = None
+            self.leases = {}
+            self.register_with_master()
+            return
+        now = time.time()
+        for handle, version in body.get('versions', {}).items():
+            # A chunk with no data here yet picks its version up with its first write.
+            if handle in self.chunks:
+                self.chunks[handle]['version'] = max(self.chunks[handle].get('version', 0), version)
+        for handle, remaining in body.get('leases', {}).items():
+            self.leases[handle] = now + remaining
+        for handle in body.get('stale', []):
+            self.leases.pop(str(handle), None)
+        self.leases = {handle: expiry for handle, expiry in self.leases.items() if expiry > now}
+        if body.get('versions'):
+            self.save_metadata()
+
+    def _chunk_version(self, chunk_handle, data):
+        # Versions only move forward; a write carrying an older version keeps the newer one.
+        return max(self.chunks.get(chunk_handle, {}).get('version', 0), data.get('version', 1))
+
     def process_op_queue(self):
         while True:
             if self.op_queue:
@@ -77,24 +131,40 @@ class GFSChunkServer:
                     self._handle_write(op['data'])
                 elif op['type'] == 'append':
                     self._handle_append(op['data'])
+                elif op['type'] == 'delete':
+                    self.delete_chunk(op['data']['chunk_handle'])
             else:
                 time.sleep(0.1)
 
+    def compact_storage(self):
+        while True:
+            time.sleep(config.SEGMENT_COMPACTION_INTERVAL_SECONDS)
+            reclaimed = self.store.compact()
+            self.store.flush()
+            if reclaimed:
+                print(f"Compaction reclaimed {reclaimed} bytes.")
+
     def queue_operation(self, op_type, data):
         self.op_queue.append({'type': op_type, 'data': data})
 
+    def _payload(self, data):
+        # Binary payloads (such as erasure-coded fragments) travel base64-encoded.
+        if data.get('encoding') == 'base64':
+            return base64.b64decode(data['data'])
+        return data['data'].encode('utf-8')
+
     def _handle_write(self, data):
         chunk_handle = str(data['chunk_handle'])
-        chunk_data = data['data']
+        chunk_data = self._payload(data)
         chunk_offset = data.get('offset', 0)
-        chunk_path = os.path.join(self.data_dir, chunk_handle)
-
-        mode = 'r+b' if os.path.exists(chunk_path) else 'wb'
-        with open(chunk_path, mode) as f:
-            if mode == 'r+b':
-                f.seek(chunk_offset)
-            f.write(chunk_data.encode('utf-8'))
-        self.chunks[chunk_handle] = {'version': data.get('version', 1)}
+
+        codec = self._chunk_codec(chunk_handle, data)
+        if codec:
+            self._write_compressed(chunk_handle, chunk_offset, chunk_data, codec, self._chunk_version(chunk_handle, data))
+        else:
+            self.store.write(chunk_handle, chunk_offset, chunk_data)
+            self.chunks[chunk_handle] = {'version': self._chunk_version(chunk_handle, data)}
+        self.mutation_times[chunk_handle] = time.time()
         self.save_metadata()
 
     def _handle_append(self, data):
@@ -102,21 +172,147 @@ class GFSChunkServer:
         if request_id in self.processed_requests:
             return
 
-        chunk_handle = data['chunk_handle']
-        chunk_data = data['data']
-        chunk_path = os.path.join(self.data_dir, str(chunk_handle))
-        with open(chunk_path, 'a') as f:
-            f.write(chunk_data)
-        self.chunks[chunk_handle] = {'version': data.get('version', 1)}
+        chunk_handle = str(data['chunk_handle'])
+        chunk_data = self._payload(data)
+        codec = self._chunk_codec(chunk_handle, data)
+        if codec:
+            length = self.chunks.get(chunk_handle, {}).get('length', 0)
+            self._write_compressed(chunk_handle, length, chunk_data, codec, self._chunk_version(chunk_handle, data))
+        else:
+            self.store.append(chunk_handle, chunk_data)
+            self.chunks[chunk_handle] = {'version': self._chunk_version(chunk_handle, data)}
+        self.mutation_times[chunk_handle] = time.time()
         self.processed_requests.add(request_id)
         self.save_metadata()
 
-    def read_chunk(self, chunk_handle):
-        chunk_path = os.path.join(self.data_dir, str(chunk_handle))
-        if os.path.exists(chunk_path):
-            with open(chunk_path, 'rb') as f:
-                return f.read().decode('utf-8')
-        return None
+    def _chunk_codec(self, chunk_handle, data):
+        # The codec is fixed when a chunk is first written; later writes reuse it.
+        if chunk_handle in self.chunks and self.store.exists(chunk_handle):
+            return self.chunks[chunk_handle].get('codec')
+        return compression.validate_codec(data.get('codec', self.codec))
+
+    def _block_offsets(self, blocks):
+        offsets = [0]
+        for _, stored_length in blocks:
+            offsets.append(offsets[-1] + stored_length)
+        return offsets
+
+    def _read_stored_blocks(self, chunk_handle, blocks, block_indices):
+        if not block_indices:
+            return []
+        # The touched blocks are contiguous, so they are fetched with a single range read.
+        offsets = self._block_offsets(blocks)
+        start = offsets[block_indices[0]]
+        stored = self.store.read(chunk_handle, start, offsets[block_indices[-1] + 1] - start)
+        return [stored[offsets[i] - start:offsets[i + 1] - start] for i in block_indices]
+
+    def _decompress(self, codec, stored_blocks):
+        start = time.thread_time()
+        raw = b''.join(compression.decompress_block(codec, block) for block in stored_blocks)
+        with self.stats_lock:
+            self.compression_stats['decompress_cpu_seconds'] += time.thread_time() - start
+        return raw
+
+    def _write_compressed(self, chunk_handle, offset, payload, codec, version):
+        block_size = config.COMPRESSION_BLOCK_SIZE_BYTES
+        meta = self.chunks.get(chunk_handle)
+        if not meta or meta.get('codec') != codec:
+            meta = {'codec': codec, 'length': 0, 'blocks': []}
+        meta['version'] = version
+        self.chunks[chunk_handle] = meta
+        if not payload:
+            return
+        blocks = meta['blocks']
+        end = offset + len(payload)
+
+        # Only the blocks overlapping the write are decompressed and recompressed;
+        # the stored bytes of every other block are kept as they are.
+        first = min(offset, meta['length']) // block_size
+        last = (end - 1) // block_size
+        touched = range(first, min(last + 1, len(blocks)))
+        raw = self._decompress(codec, self._read_stored_blocks(chunk_handle, blocks, touched)) if touched else b''
+        relative = offset - first * block_size
+        if len(raw) < relative:
+            raw += b'\0' * (relative - len(raw))
+        raw = raw[:relative] + payload + raw[relative + len(payload):]
+
+        start = time.thread_time()
+        new_blocks = [compression.compress_block(codec, block) for block in compression.split_blocks(raw, block_size)]
+        cpu = time.thread_time() - start
+
+        offsets = self._block_offsets(blocks)
+        suffix_start = min(last + 1, len(blocks))
+        suffix = self.store.read(chunk_handle, offsets[suffix_start]) or b''
+        self.store.write(chunk_handle, offsets[first], b''.join(new_blocks) + suffix, truncate=True)
+
+        meta['blocks'] = blocks[:first] + [[len(raw_block), len(block)] for raw_block, block in
+                                           zip(compression.split_blocks(raw, block_size), new_blocks)] + blocks[suffix_start:]
+        meta['length'] = max(meta['length'], end)
+        with self.stats_lock:
+            self.compression_stats['compress_cpu_seconds'] += cpu
+
+    def _compressed_range(self, chunk_handle, offset, length):
+        meta = self.chunks[chunk_handle]
+        block_size = config.COMPRESSION_BLOCK_SIZE_BYTES
+        indices = compression.blocks_for_range(offset, length, meta['length'], block_size)
+        if length < 0:
+            length = meta['length'] - offset
+        length = max(0, min(length, meta['length'] - offset))
+        return indices, offset - indices.start * block_size if indices else 0, length
+
+    def delete_chunk(self, chunk_handle):
+        chunk_handle = str(chunk_handle)
+        self.store.delete(chunk_handle)
+        self.chunks.pop(chunk_handle, None)
+        self.leases.pop(chunk_handle, None)
+        self.mutation_times.pop(chunk_handle, None)
+        self.save_metadata()
+
+    def read_chunk(self, chunk_handle, offset=0, length=-1):
+        content = self.read_chunk_bytes(chunk_handle, offset, length)
+        return content.decode('utf-8') if content is not None else None
+
+    def read_chunk_bytes(self, chunk_handle, offset=0, length=-1):
+        chunk_handle = str(chunk_handle)
+        if not self.store.exists(chunk_handle):
+            return None
+        meta = self.chunks.get(chunk_handle, {})
+        if meta.get('codec'):
+            # Range reads only decompress the blocks they touch.
+            indices, skip, length = self._compressed_range(chunk_handle, offset, length)
+            raw = self._decompress(meta['codec'], self._read_stored_blocks(chunk_handle, meta['blocks'], indices))
+            return raw[skip:skip + length]
+        return self.store.read(chunk_handle, offset, length)
+
+    def read_chunk_compressed(self, chunk_handle, offset=0, length=-1):
+        """Returns the stored blocks covering a range without decompressing them."""
+        chunk_handle = str(chunk_handle)
+        meta = self.chunks.get(chunk_handle, {})
+        if not meta.get('codec') or not self.store.exists(chunk_handle):
+            return None
+        indices, skip, length = self._compressed_range(chunk_handle, offset, length)
+        return {
+            'codec': meta['codec'],
+            'skip': skip,
+            'length': length,
+            'blocks': [base64.b64encode(block).decode('ascii') for block in self._read_stored_blocks(chunk_handle, meta['blocks'], indices)]
+        }
+
+    def get_stats(self):
+        compressed = [meta for meta in list(self.chunks.values()) if meta.get('codec')]
+        raw_bytes = sum(raw for meta in compressed for raw, _ in meta['blocks'])
+        stored_bytes = sum(stored for meta in compressed for _, stored in meta['blocks'])
+        with self.stats_lock:
+            stats = dict(self.compression_stats)
+        stats.update({
+            'codec': self.codec,
+            'compressed_chunks': len(compressed),
+            'raw_bytes': raw_bytes,
+            'stored_bytes': stored_bytes,
+            'compression_ratio': raw_bytes / stored_bytes if stored_bytes else 1.0,
+            'storage': self.store.stats()
+        })
+        return stats
 
 chunk_server = None
 
@@ -134,19 +330,57 @@ def append():
 
 @app.route('/read', methods=['GET'])
 def read():
+    with chunk_server.stats_lock:
+        chunk_server.active_reads += 1
+    try:
+        response = read_range()
+    finally:
+        with chunk_server.stats_lock:
+            chunk_server.active_reads -= 1
+    return response
+
+def read_range():
     chunk_handle = str(request.args['chunk_handle'])
-    content = chunk_server.read_chunk(chunk_handle)
+    offset = int(request.args.get('offset', 0))
+    length = int(request.args.get('length', -1))
+    if request.args.get('compressed') == '1':
+        blocks = chunk_server.read_chunk_compressed(chunk_handle, offset, length)
+        if blocks is not None:
+            return jsonify(dict(blocks, load=chunk_server.load()))
+    if request.args.get('encoding') == 'base64':
+        content = chunk_server.read_chunk_bytes(chunk_handle, offset, length)
+        if content is None:
+            return jsonify({'error': 'chunk_not_found'}), 404
+        return jsonify({'data': base64.b64encode(content).decode('ascii'), 'encoding': 'base64', 'load': chunk_server.load()})
+    content = chunk_server.read_chunk(chunk_handle, offset, length)
     if content is not None:
-        return jsonify({'data': content})
+        return jsonify({'data': content, 'load': chunk_server.load()})
     else:
         return jsonify({'data': ''})
 
+@app.route('/checksum', methods=['GET'])
+def checksum():
+    content = chunk_server.read_chunk_bytes(request.args['chunk_handle'], int(request.args.get('offset', 0)), int(request.args.get('length', -1)))
+    if content is None:
+        return jsonify({'error': 'chunk_not_found'}), 404
+    return jsonify({'crc32': zlib.crc32(content), 'length': len(content)})
+
+@app.route('/delete', methods=['POST'])
+def delete():
+    chunk_server.queue_operation('delete', request.json)
+    return jsonify({'status': 'delete_queued'})
+
+@app.route('/stats', methods=['GET'])
+def stats():
+    return jsonify(chunk_server.get_stats())
+
 if __name__ == '__main__':
-    if len(sys.argv) != 3:
-        print("Usage: python chunk_server.py <port> <data_directory>")
+    if len(sys.argv) not in (3, 4):
+        print("Usage: python chunk_server.py <port> <data_directory> [zlib|lzma]")
         sys.exit(1)
 
     port = int(sys.argv[1])
     data_dir = sys.argv[2]
-    chunk_server = GFSChunkServer(port, data_dir)
+    codec = sys.argv[3] if len(sys.argv) == 4 else config.CHUNK_COMPRESSION
+    chunk_server = GFSChunkServer(port, data_dir, codec)
     app.run(port=port, debug=True, use_reloader=False)
\ No newline at end of file
@@ -0,0 +1,272 @@
+import os
+import json
+import struct
+import threading
+import config
+
+class FilePerChunkStore:
+    """Stores every chunk as its own file, named by chunk handle, in the data directory."""
+
+    def __init__(self, data_dir):
+        self.data_dir = data_dir
+
+    def _path(self, chunk_handle):
+        return os.path.join(self.data_dir, str(chunk_handle))
+
+    def exists(self, chunk_handle):
+        return os.path.exists(self._path(chunk_handle))
+
+    def read(self, chunk_handle, offset=0, length=-1):
+        path = self._path(chunk_handle)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            return f.read(length)
+
+    def write(self, chunk_handle, offset, data, truncate=False):
+        path = self._path(chunk_handle)
+        mode = 'r+b' if os.path.exists(path) else 'wb'
+        with open(path, mode) as f:
+            f.seek(offset)
+            f.write(data)
+            if truncate:
+                f.truncate()
+
+    def append(self, chunk_handle, data):
+        with open(self._path(chunk_handle), 'ab') as f:
+            f.write(data)
+
+    def delete(self, chunk_handle):
+        path = self._path(chunk_handle)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def flush(self):
+        pass
+
+    def compact(self):
+        return 0
+
+    def stats(self):
+        return {'backend': 'file'}
+
+# Segment record layout: handle length, data length, chunk offset, kind, handle bytes, data bytes.
+RECORD_HEADER = struct.Struct('<HIIB')
+WRITE, REPLACE, DELETE = 0, 1, 2
+
+class SegmentStore:
+    """Packs chunks into large append-only segment files.
+
+    Every write appends one record holding just the bytes written and the chunk
+    offset they go to. The index maps each handle to its length and its list of
+    extents [chunk_offset, segment, offset, length], later extents overriding
+    earlier ones. A REPLACE record also truncates the chunk after its data.
+    Chunks with more than MAX_EXTENTS extents, and every chunk compact() moves,
+    are merged back into a single extent. The index is persisted by flush();
+    records appended after the last flush are replayed at startup.
+    """
+
+    INDEX_FILE = 'segment_index.json'
+    MAX_EXTENTS = 128
+
+    def __init__(self, data_dir, segment_size=config.SEGMENT_SIZE_BYTES):
+        self.data_dir = data_dir
+        self.segment_size = segment_size
+        self.lock = threading.RLock()
+        self.index = {}
+        self.segment_sizes = {}
+        self.live_bytes = {}
+        self.active_segment = 0
+        self.active_file = None
+        self._load()
+
+    def _segment_path(self, segment_id):
+        return os.path.join(self.data_dir, f"segment_{segment_id:06d}.seg")
+
+    def _load(self):
+        segments = sorted(int(name[8:-4]) for name in os.listdir(self.data_dir)
+                          if name.startswith('segment_') and name.endswith('.seg'))
+        self.segment_sizes = {segment_id: os.path.getsize(self._segment_path(segment_id)) for segment_id in segments}
+
+        replay_segment, replay_offset = (segments[0] if segments else 0), 0
+        index_path = os.path.join(self.data_dir, self.INDEX_FILE)
+        if os.path.exists(index_path):
+            with open(index_path, 'r') as f:
+                data = json.load(f)
+            self.index = data['index']
+            replay_segment, replay_offset = data['active_segment'], data['active_offset']
+        for _, extents in self.index.values():
+            for _, segment_id, _, extent_length in extents:
+                self.live_bytes[segment_id] = self.live_bytes.get(segment_id, 0) + extent_length
+
+        for segment_id in segments:
+            if segment_id >= replay_segment:
+                end = self._replay(segment_id, replay_offset if segment_id == replay_segment else 0)
+                if end < self.segment_sizes[segment_id]:
+                    # Drop a torn record left behind by a crash mid-append.
+                    os.truncate(self._segment_path(segment_id), end)
+                    self.segment_sizes[segment_id] = end
+
+        self.active_segment = segments[-1] if segments else 0
+
+    def _replay(self, segment_id, offset):
+        size = self.segment_sizes[segment_id]
+        with open(self._segment_path(segment_id), 'rb') as f:
+            f.seek(offset)
+            while offset + RECORD_HEADER.size <= size:
+                handle_length, data_length, chunk_offset, kind = RECORD_HEADER.unpack(f.read(RECORD_HEADER.size))
+                data_offset = offset + RECORD_HEADER.size + handle_length
+                end = data_offset + data_length
+                if end > size:
+                    break
+                chunk_handle = f.read(handle_length).decode('utf-8')
+                self._apply(chunk_handle, kind, chunk_offset, segment_id, data_offset, data_length)
+                f.seek(data_length, os.SEEK_CUR)
+                offset = end
+        return offset
+
+    def _apply(self, chunk_handle, kind, chunk_offset, segment_id, data_offset, data_length):
+        if kind == DELETE:
+            entry = self.index.pop(chunk_handle, None)
+            for _, old_segment, _, old_length in (entry[1] if entry else []):
+                self.live_bytes[old_segment] -= old_length
+            return
+        entry = self.index.setdefault(chunk_handle, [0, []])
+        end = chunk_offset + data_length
+        kept = []
+        for extent in entry[1]:
+            extent_offset, old_segment, _, old_length = extent
+            if chunk_offset <= extent_offset and extent_offset + old_length <= end or kind == REPLACE and extent_offset >= end:
+                # Fully overwritten, or cut off by the truncation.
+                self.live_bytes[old_segment] -= old_length
+                continue
+            if kind == REPLACE and extent_offset + old_length > end:
+                self.live_bytes[old_segment] -= extent_offset + old_length - end
+                extent[3] = end - extent_offset
+            kept.append(extent)
+        if data_length:
+            kept.append([chunk_offset, segment_id, data_offset, data_length])
+            self.live_bytes[segment_id] = self.live_bytes.get(segment_id, 0) + data_length
+        entry[1] = kept
+        entry[0] = end if kind == REPLACE else max(entry[0], end)
+
+    def _append_record(self, chunk_handle, kind, chunk_offset, data):
+        encoded_handle = chunk_handle.encode('utf-8')
+        record = RECORD_HEADER.pack(len(encoded_handle), len(data), chunk_offset, kind) + encoded_handle + data
+
+        size = self.segment_sizes.get(self.active_segment, 0)
+        if size and size + len(record) > self.segment_size:
+            self._close_active()
+            self.active_segment += 1
+            size = 0
+        if self.active_file is None:
+            self.active_file = open(self._segment_path(self.active_segment), 'ab')
+        self.active_file.write(record)
+        self.active_file.flush()
+        self.segment_sizes[self.active_segment] = size + len(record)
+        self._apply(chunk_handle, kind, chunk_offset, self.active_segment, size + len(record) - len(data), len(data))
+
+        entry = self.index.get(chunk_handle)
+        if entry and len(entry[1]) > self.MAX_EXTENTS:
+            self._merge(chunk_handle)
+
+    def _merge(self, chunk_handle):
+        self._append_record(chunk_handle, REPLACE, 0, self.read(chunk_handle))
+
+    def _close_active(self):
+        if self.active_file is not None:
+            self.active_file.close()
+            self.active_file = None
+
+    def exists(self, chunk_handle):
+        return str(chunk_handle) in self.index
+
+    def read(self, chunk_handle, offset=0, length=-1):
+        with self.lock:
+            entry = self.index.get(str(chunk_handle))
+            if entry is None:
+                return None
+            chunk_length, extents = entry
+            start = min(offset, chunk_length)
+            stop = chunk_length if length < 0 else min(chunk_length, start + length)
+            result = bytearray(stop - start)
+            files = {}
+            try:
+                # Reading under the lock keeps compaction from unlinking a segment first.
+                for extent_offset, segment_id, data_offset, extent_length in extents:
+                    low, high = max(start, extent_offset), min(stop, extent_offset + extent_length)
+                    if low >= high:
+                        continue
+                    if segment_id not in files:
+                        files[segment_id] = open(self._segment_path(segment_id), 'rb')
+                    f = files[segment_id]
+                    f.seek(data_offset + low - extent_offset)
+                    result[low - start:high - start] = f.read(high - low)
+            finally:
+                for f in files.values():
+                    f.close()
+            return bytes(result)
+
+    def write(self, chunk_handle, offset, data, truncate=False):
+        with self.lock:
+            self._append_record(str(chunk_handle), REPLACE if truncate else WRITE, offset, data)
+
+    def append(self, chunk_handle, data):
+        chunk_handle = str(chunk_handle)
+        with self.lock:
+            entry = self.index.get(chunk_handle)
+            self._append_record(chunk_handle, WRITE, entry[0] if entry else 0, data)
+
+    def delete(self, chunk_handle):
+        chunk_handle = str(chunk_handle)
+        with self.lock:
+            if chunk_handle in self.index:
+                self._append_record(chunk_handle, DELETE, 0, b'')
+
+    def flush(self):
+        with self.lock:
+            index_path = os.path.join(self.data_dir, self.INDEX_FILE)
+            with open(index_path + '.tmp', 'w') as f:
+                json.dump({
+                    'active_segment': self.active_segment,
+                    'active_offset': self.segment_sizes.get(self.active_segment, 0),
+                    'index': self.index
+                }, f)
+            os.replace(index_path + '.tmp', index_path)
+
+    def compact(self, threshold=config.SEGMENT_COMPACTION_THRESHOLD):
+        """Rewrites the live chunks of sealed segments whose live fraction is below threshold."""
+        reclaimed = 0
+        with self.lock:
+            victims = [segment_id for segment_id, size in self.segment_sizes.items()
+                       if segment_id != self.active_segment and self.live_bytes.get(segment_id, 0) < threshold * size]
+            # Each chunk with data in a victim is merged into one new extent.
+            moving = [h for h, (_, extents) in self.index.items() if any(extent[1] in victims for extent in extents)]
+            for chunk_handle in moving:
+                self._merge(chunk_handle)
+            if victims:
+                # Persist the new locations before the old copies disappear.
+                self.flush()
+            for segment_id in victims:
+                os.remove(self._segment_path(segment_id))
+                reclaimed += self.segment_sizes.pop(segment_id)
+                self.live_bytes.pop(segment_id, None)
+        return reclaimed
+
+    def stats(self):
+        with self.lock:
+            return {
+                'backend': 'segment',
+                'segments': len(self.segment_sizes),
+                'chunks': len(self.index),
+                'live_bytes': sum(self.live_bytes.values()),
+                'total_bytes': sum(self.segment_sizes.values())
+            }
+
+def create_store(backend, data_dir):
+    if backend == 'file':
+        return FilePerChunkStore(data_dir)
+    if backend == 'segment':
+        return SegmentStore(data_dir)
+    raise ValueError(f"Unknown chunk storage backend: {backend}")
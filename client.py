@@ -1,27 +1,70 @@
 import requests
 import uuid
 import time
+import base64
+import zlib
 import config
+import compression
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from erasure import ReedSolomon
+from append_buffer import BufferedAppender
+from replica_selection import ReplicaSelector
+import gfs_file
 
 class GFSClient:
-    def __init__(self):
+    def __init__(self, accept_compressed=config.CLIENT_ACCEPT_COMPRESSED_READS, shadow_urls=None, hedge_reads=config.CLIENT_HEDGE_READS):
         self.master_url = f"http://{config.MASTER_HOST}:{config.MASTER_PORT}"
+        if shadow_urls is None:
+            shadow_urls = [f"http://{config.MASTER_HOST}:{port}" for port in config.SHADOW_MASTER_PORTS]
+        self.shadow_urls = shadow_urls
+        self.next_shadow = 0
         self.chunk_cache = {}
+        self.accept_compressed = accept_compressed
+        self.hedge_reads = hedge_reads
+        self.replica_selector = ReplicaSelector()
+        self.read_pool = ThreadPoolExecutor(max_workers=config.CLIENT_READ_THREADS)
+        # Read-ahead gets its own threads: its tasks wait on replica reads in read_pool.
+        self.read_ahead_pool = ThreadPoolExecutor(max_workers=config.CLIENT_READ_THREADS)
 
-    def _get_chunk_locations(self, filename, chunk_index):
+    def _read_from_shadows(self, route, params):
+        # Metadata reads are spread round-robin over the shadow masters. A shadow
+        # that is down or has not caught up yet is skipped, ending at the primary.
+        start = self.next_shadow
+        self.next_shadow += 1
+        for i in range(len(self.shadow_urls)):
+            url = self.shadow_urls[(start + i) % len(self.shadow_urls)]
+            try:
+                response = requests.get(f"{url}/{route}", params=params, timeout=5)
+                if response.status_code == 200:
+                    return response
+            except requests.exceptions.RequestException:
+                continue
+        return None
+
+    def _get_chunk_locations(self, filename, chunk_index, for_write=False):
         cache_key = f"{filename}:{chunk_index}"
-        if cache_key in self.chunk_cache and time.time() < self.chunk_cache[cache_key]['expiry']:
-            return self.chunk_cache[cache_key]['locations']
+        cached = self.chunk_cache.get(cache_key)
+        # A write needs the lease holder, which only the primary master hands out.
+        if cached and time.time() < cached['expiry'] and not (for_write and (cached['from_shadow'] or cached['locations'].get('primary') is None)):
+            return cached['locations']
 
+        params = {'filename': filename, 'chunk_index': chunk_index}
+        if for_write:
+            params['mutation'] = 1
+        response = None if for_write else self._read_from_shadows('get_chunk_locations', params)
+        from_shadow = response is not None
         try:
-            response = requests.get(f"{self.master_url}/get_chunk_locations", params={
-                'filename': filename,
-                'chunk_index': chunk_index
-            })
+            if response is None:
+                response = requests.get(f"{self.master_url}/get_chunk_locations", params=params)
             if response.status_code == 200:
                 locations = response.json()
+                # The master's loads come from heartbeats, up to an interval old.
+                measured_at = time.time() - config.HEARTBEAT_INTERVAL_SECONDS
+                for port, load in zip(locations.get('locations', []), locations.get('loads', [])):
+                    self.replica_selector.report_load(port, load, measured_at)
                 self.chunk_cache[cache_key] = {
                     'locations': locations,
+                    'from_shadow': from_shadow,
                     'expiry': time.time() + config.CLIENT_CHUNK_CACHE_TTL_SECONDS
                 }
                 return locations
@@ -30,9 +73,14 @@ class GFSClient:
         except requests.exceptions.ConnectionError:
             return None
 
-    def create(self, filename):
+    def create(self, filename, codec=None, storage_class=None):
         try:
-            response = requests.post(f"{self.master_url}/create", json={'filename': filename}, timeout=5)
+            payload = {'filename': filename}
+            if codec:
+                payload['codec'] = codec
+            if storage_class:
+                payload['storage_class'] = storage_class
+            response = requests.post(f"{self.master_url}/create", json=payload, timeout=5)
             return response.status_code == 200
         except requests.exceptions.RequestException as e:
             print(f"An error occurred: {e}")
@@ -40,7 +88,9 @@ class GFSClient:
 
     def ls(self, path):
         try:
-            response = requests.get(f"{self.master_url}/ls", params={'path': path})
+            response = self._read_from_shadows('ls', {'path': path})
+            if response is None:
+                response = requests.get(f"{self.master_url}/ls", params={'path': path})
             if response.status_code == 200:
                 return response.json()
             else:
@@ -48,9 +98,12 @@ class GFSClient:
         except requests.exceptions.ConnectionError:
             return None
 
-    def get_file_info(self, filename):
+    def get_file_info(self, filename, consistent=False):
+        # Mutations need the primary's view; plain lookups may be slightly stale.
         try:
-            response = requests.get(f"{self.master_url}/get_file_info", params={'filename': filename}, timeout=5)
+            response = None if consistent else self._read_from_shadows('get_file_info', {'filename': filename})
+            if response is None:
+                response = requests.get(f"{self.master_url}/get_file_info", params={'filename': filename}, timeout=5)
             if response.status_code == 200:
                 return response.json()
             else:
@@ -63,39 +116,68 @@ class GFSClient:
         chunk_index = offset // config.CHUNK_SIZE_BYTES
         chunk_offset = offset % config.CHUNK_SIZE_BYTES
 
-        locations = self._get_chunk_locations(filename, chunk_index)
+        locations = self._get_chunk_locations(filename, chunk_index, for_write=True)
         if not locations:
             return False
 
+        if locations.get('erasure'):
+            print(f"Error: chunk {chunk_index} of {filename} is erasure-coded and read-only")
+            return False
+
         chunk_handle = locations['chunk_handle']
         primary_port = locations['primary']
         replica_ports = locations['locations']
 
         # In a real implementation, we would write to the primary and the primary would forward to secondaries.
         # For simplicity, we write to all replicas directly.
+        payload = {
+            'chunk_handle': chunk_handle,
+            'data': data,
+            'offset': chunk_offset
+        }
+        if isinstance(data, bytes):
+            payload['data'] = base64.b64encode(data).decode('ascii')
+            payload['encoding'] = 'base64'
+        if 'version' in locations:
+            payload['version'] = locations['version']
+        if locations.get('codec'):
+            payload['codec'] = locations['codec']
+        accepted = 0
         for port in replica_ports:
             try:
-                requests.post(f"http://127.0.0.1:{port}/write", json={
-                    'chunk_handle': chunk_handle,
-                    'data': data,
-                    'offset': chunk_offset
-                })
+                response = requests.post(f"http://127.0.0.1:{port}/write", json=payload)
+                accepted += response.status_code == 200
             except requests.exceptions.ConnectionError:
                 continue
-        return True
+        if not accepted:
+            print(f"Error: no replica of chunk {chunk_index} of {filename} accepted the write")
+        return accepted > 0
 
     def append(self, filename, data):
-        file_info = self.get_file_info(filename)
+        return self.record_append(filename, data) is not None
+
+    def record_append(self, filename, data):
+        """Appends data to the end of a file and returns the offset it was written at, or None."""
+        file_info = self.get_file_info(filename, consistent=True)
         if not file_info:
             print(f"Error: Could not get file info for {filename}")
-            return False
+            return None
 
-        current_length = file_info.get('length', 0)
-        if self.write(filename, data, offset=current_length):
+        offset = file_info.get('length', 0)
+        # As in GFS, a record never straddles a chunk boundary: one that does not
+        # fit in the rest of the last chunk starts at the beginning of the next.
+        chunk_offset = offset % config.CHUNK_SIZE_BYTES
+        if len(data) <= config.CHUNK_SIZE_BYTES and chunk_offset + len(data) > config.CHUNK_SIZE_BYTES:
+            offset += config.CHUNK_SIZE_BYTES - chunk_offset
+        if self.write(filename, data, offset=offset):
             # After successful write, inform master about new length
-            new_length = current_length + len(data)
-            return self.update_file_length(filename, new_length)
-        return False
+            if self.update_file_length(filename, offset + len(data)):
+                return offset
+        return None
+
+    def buffered_appender(self, **kwargs):
+        """Returns a BufferedAppender that batches small appends made through this client."""
+        return BufferedAppender(self, **kwargs)
 
     def update_file_length(self, filename, new_length):
         try:
@@ -105,7 +187,19 @@ class GFSClient:
             print(f"An error occurred while updating file length: {e}")
             return False
 
+    def open(self, filename, mode='rb', buffering=-1):
+        """Opens a GFS file as a Python file object (see gfs_file.py)."""
+        return gfs_file.open_file(self, filename, mode, buffering)
+
     def read(self, filename, offset=0, length=-1):
+        content = self._read_range(filename, offset, length)
+        return content.decode('utf-8') if content is not None else None
+
+    def read_bytes(self, filename, offset=0, length=-1):
+        """Like read(), but returns the bytes of the range as stored."""
+        return self._read_range(filename, offset, length, binary=True)
+
+    def _read_range(self, filename, offset, length, binary=False):
         chunk_index = offset // config.CHUNK_SIZE_BYTES
         chunk_offset = offset % config.CHUNK_SIZE_BYTES
 
@@ -113,19 +207,174 @@ class GFSClient:
         if not locations:
             return None
 
+        if locations.get('erasure'):
+            return self._read_erasure_coded(locations['erasure'], chunk_offset, length)
+
         chunk_handle = locations['chunk_handle']
-        replica_ports = locations['locations']
+        replica_ports = self.replica_selector.order(locations['locations'])
 
-        for port in replica_ports:
-            try:
-                response = requests.get(f"http://127.0.0.1:{port}/read", params={'chunk_handle': chunk_handle})
-                if response.status_code == 200:
-                    # In a real implementation, we would handle chunk boundaries and length
-                    return response.json()['data']
-            except requests.exceptions.ConnectionError:
-                continue
+        params = {'chunk_handle': chunk_handle, 'offset': chunk_offset, 'length': length}
+        if self.accept_compressed:
+            params['compressed'] = 1
+        if binary:
+            params['encoding'] = 'base64'
+        body = self._hedged_read(replica_ports, params)
+        # In a real implementation, we would handle chunk boundaries
+        return self._decode_read_response(body) if body is not None else None
+
+    def verify(self, filename, offset, data):
+        """Returns True if every stored copy of a range of one chunk holds exactly data.
+
+        Each replica compares its crc32 of the range. For an erasure-coded chunk,
+        each data fragment compares the crc32 of its share of the range.
+        """
+        chunk_offset = offset % config.CHUNK_SIZE_BYTES
+        locations = self._get_chunk_locations(filename, offset // config.CHUNK_SIZE_BYTES)
+        if not locations:
+            return False
+        if locations.get('erasure'):
+            return self._verify_erasure_coded(locations['erasure'], chunk_offset, data)
+        crc = zlib.crc32(data)
+        crcs = [self._checksum(port, locations['chunk_handle'], chunk_offset, len(data)) for port in locations['locations']]
+        return bool(crcs) and all(c == crc for c in crcs)
+
+    def _checksum(self, port, chunk_handle, offset, length):
+        if port is None:
+            return None
+        try:
+            response = requests.get(f"http://127.0.0.1:{port}/checksum", params={
+                'chunk_handle': chunk_handle,
+                'offset': offset,
+                'length': length
+            }, timeout=config.CLIENT_READ_TIMEOUT_SECONDS)
+            return response.json()['crc32'] if response.status_code == 200 else None
+        except requests.exceptions.RequestException:
+            return None
+
+    def _verify_erasure_coded(self, layout, chunk_offset, data):
+        end = chunk_offset + len(data)
+        if end > layout['length']:
+            return False
+        size = ReedSolomon(layout['k'], layout['m']).fragment_size(layout['length'])
+        for index in range(chunk_offset // size, (end - 1) // size + 1):
+            start = max(chunk_offset, index * size)
+            stop = min(end, (index + 1) * size)
+            fragment = layout['fragments'][index]
+            crc = self._checksum(fragment['port'], fragment['chunk_handle'], start - index * size, stop - start)
+            if crc != zlib.crc32(data[start - chunk_offset:stop - chunk_offset]):
+                return False
+        return True
+
+    def _read_replica(self, port, params):
+        start = time.perf_counter()
+        try:
+            response = requests.get(f"http://127.0.0.1:{port}/read", params=params, timeout=config.CLIENT_READ_TIMEOUT_SECONDS)
+        except requests.exceptions.RequestException:
+            # An unreachable replica counts as the slowest possible one.
+            self.replica_selector.record(port, config.CLIENT_READ_TIMEOUT_SECONDS)
+            return None
+        self.replica_selector.record(port, time.perf_counter() - start)
+        if response.status_code != 200:
+            return None
+        body = response.json()
+        if 'load' in body:
+            self.replica_selector.report_load(port, body['load'])
+        return body
+
+    def _hedged_read(self, replica_ports, params):
+        if not self.hedge_reads or len(replica_ports) < 2:
+            for port in replica_ports:
+                body = self._read_replica(port, params)
+                if body is not None:
+                    return body
+            return None
+
+        # The best replica is asked first. If it has not answered within the
+        # hedge delay, the next one is asked too and the first answer wins; a
+        # failed read fails over to the next replica straight away.
+        remaining = list(replica_ports)
+        first = self.read_pool.submit(self._read_replica, remaining.pop(0), params)
+        pending = {first}
+        hedged = False
+        while pending:
+            timeout = None if hedged or not remaining else self.replica_selector.hedge_delay()
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                body = future.result()
+                if body is not None:
+                    # requests cannot abort a call in flight, so a loser that has
+                    # started runs until its timeout and only its answer is dropped.
+                    for loser in pending:
+                        loser.cancel()
+                    if hedged:
+                        self.replica_selector.record_hedge(won=future is not first)
+                    return body
+            if not done:
+                hedged = True
+            if remaining:
+                pending.add(self.read_pool.submit(self._read_replica, remaining.pop(0), params))
+        if hedged:
+            self.replica_selector.record_hedge(won=False)
+        return None
+
+    def _read_fragment(self, fragment, offset, length):
+        if fragment['port'] is None:
+            return None
+        try:
+            response = requests.get(f"http://127.0.0.1:{fragment['port']}/read", params={
+                'chunk_handle': fragment['chunk_handle'],
+                'offset': offset,
+                'length': length,
+                'encoding': 'base64'
+            }, timeout=5)
+            if response.status_code == 200:
+                data = base64.b64decode(response.json()['data'])
+                return data if len(data) == length else None
+        except requests.exceptions.RequestException:
+            pass
         return None
 
+    def _read_erasure_coded(self, layout, chunk_offset, length):
+        rs = ReedSolomon(layout['k'], layout['m'])
+        chunk_length = layout['length']
+        end = chunk_length if length < 0 else min(chunk_offset + length, chunk_length)
+        if chunk_offset >= end:
+            return b''
+        size = rs.fragment_size(chunk_length)
+
+        # Healthy read: fetch the requested range straight from the data fragments holding it.
+        parts = []
+        for index in range(chunk_offset // size, (end - 1) // size + 1):
+            start = max(chunk_offset, index * size)
+            stop = min(end, (index + 1) * size)
+            part = self._read_fragment(layout['fragments'][index], start - index * size, stop - start)
+            if part is None:
+                break
+            parts.append(part)
+        else:
+            return b''.join(parts)
+
+        # Degraded read: rebuild the chunk from any k surviving fragments.
+        available = {}
+        for index, fragment in enumerate(layout['fragments']):
+            data = self._read_fragment(fragment, 0, size)
+            if data is not None:
+                available[index] = data
+                if len(available) == rs.k:
+                    break
+        if len(available) < rs.k:
+            return None
+        return rs.decode(available, chunk_length)[chunk_offset:end]
+
+    def _decode_read_response(self, body):
+        if 'blocks' in body:
+            # The chunk server shipped the compressed blocks covering the range as stored.
+            raw = b''.join(compression.decompress_block(body['codec'], base64.b64decode(block)) for block in body['blocks'])
+            return raw[body['skip']:body['skip'] + body['length']]
+        if body.get('encoding') == 'base64':
+            return base64.b64decode(body['data'])
+        return body['data'].encode('utf-8')
+
 if __name__ == '__main__':
     client = GFSClient()
 
@@ -0,0 +1,32 @@
+import lzma
+import zlib
+
+# Codecs available for per-block chunk compression. Each entry maps a codec name
+# (as stored in chunk metadata) to its (compress, decompress) functions.
+CODECS = {
+    'zlib': (lambda data: zlib.compress(data, 6), zlib.decompress),
+    'lzma': (lambda data: lzma.compress(data, preset=1), lzma.decompress),
+}
+
+def validate_codec(codec):
+    if codec is not None and codec not in CODECS:
+        raise ValueError(f"Unknown compression codec: {codec}")
+    return codec
+
+def compress_block(codec, data):
+    return CODECS[codec][0](data)
+
+def decompress_block(codec, data):
+    return CODECS[codec][1](data)
+
+def split_blocks(data, block_size):
+    return [data[i:i + block_size] for i in range(0, len(data), block_size)]
+
+def blocks_for_range(offset, length, total_length, block_size):
+    """Returns the indices of the blocks touched by the byte range [offset, offset + length)."""
+    if length < 0:
+        length = total_length - offset
+    end = min(offset + length, total_length)
+    if offset >= end:
+        return range(0)
+    return range(offset // block_size, (end - 1) // block_size + 1)
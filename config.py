@@ -9,9 +9,33 @@ OPERATION_LOG = "gfs_op.log"
 LEASE_TIME_SECONDS = 60
 HEARTBEAT_INTERVAL_SECONDS = 10
 REPLICATION_FACTOR = 1
+DEFAULT_STORAGE_CLASS = "replicated"  # "replicated" or "erasure"
+ERASURE_DATA_FRAGMENTS = 4  # k: fragments holding chunk data
+ERASURE_PARITY_FRAGMENTS = 2  # m: Reed-Solomon parity fragments, any k of k + m rebuild a chunk
+COLD_FILE_AGE_SECONDS = 3600  # "erasure" files are encoded once unmodified for this long
+ERASURE_CODING_SCAN_INTERVAL_SECONDS = 60
+CHECKPOINT_INTERVAL_SECONDS = 60  # the operation log covers changes made since the last checkpoint
+SHADOW_MASTER_PORTS = []  # read-only shadow masters, e.g. [50060, 50061]
+SHADOW_LOG_POLL_INTERVAL_SECONDS = 1
 
 # Chunk Server Configuration
 CHUNK_SIZE_BYTES = 64 * 1024  # 64 KB
+CHUNK_COMPRESSION = None  # None, 'zlib' or 'lzma'; files can override this at create time
+COMPRESSION_BLOCK_SIZE_BYTES = 8 * 1024  # 8 KB, unit of compression and of range reads
+CHUNK_STORAGE_BACKEND = "file"  # "file" (one OS file per chunk) or "segment" (packed segment files)
+SEGMENT_SIZE_BYTES = 64 * 1024 * 1024  # 64 MB
+SEGMENT_COMPACTION_THRESHOLD = 0.5  # compact sealed segments that are less than half live
+SEGMENT_COMPACTION_INTERVAL_SECONDS = 60
 
 # Client Configuration
 CLIENT_CHUNK_CACHE_TTL_SECONDS = 60
+CLIENT_ACCEPT_COMPRESSED_READS = False  # ask chunk servers to ship compressed blocks
+APPEND_BATCH_MAX_BYTES = 16 * 1024  # BufferedAppender submits a batch once it holds this much
+APPEND_BATCH_MAX_DELAY_SECONDS = 0.05  # ... or once its oldest record has waited this long
+CLIENT_READ_TIMEOUT_SECONDS = 5
+CLIENT_READ_THREADS = 16  # worker threads for replica reads, including hedged ones
+CLIENT_LATENCY_EWMA_ALPHA = 0.2  # weight of the newest sample in a replica's latency estimate
+CLIENT_HEDGE_READS = True  # send a second read to another replica when the first is slow
+CLIENT_HEDGE_PERCENTILE = 95  # ... slower than this percentile of recent read latencies
+CLIENT_HEDGE_INITIAL_DELAY_SECONDS = 0.05  # hedge delay until enough latencies have been seen
+CLIENT_READ_AHEAD_CHUNKS = 2  # chunks fetched ahead of a sequential reader of a file object
@@ -0,0 +1,97 @@
+"""Systematic Reed-Solomon erasure coding over GF(2^8).
+
+Data is split into k data fragments plus m Cauchy parity fragments, and any k
+of them rebuild it. Fragments are scaled with bytes.translate() lookup tables
+and added as big integers, so no step is a Python loop over bytes.
+"""
+
+_EXP = [0] * 512
+_LOG = [0] * 256
+_value = 1
+for _i in range(255):
+    _EXP[_i] = _value
+    _LOG[_value] = _i
+    _value <<= 1
+    if _value & 0x100:
+        _value ^= 0x11d
+for _i in range(255, 512):
+    _EXP[_i] = _EXP[_i - 255]
+
+def gf_mul(a, b):
+    if a == 0 or b == 0:
+        return 0
+    return _EXP[_LOG[a] + _LOG[b]]
+
+def gf_inv(a):
+    if a == 0:
+        raise ZeroDivisionError("0 has no inverse in GF(256)")
+    return _EXP[255 - _LOG[a]]
+
+# _MUL_TABLES[c] maps every byte x to c * x, for use with bytes.translate().
+_MUL_TABLES = [bytes(gf_mul(c, x) for x in range(256)) for c in range(256)]
+
+def _linear_combination(coefficients, fragments, size):
+    result = 0
+    for coefficient, fragment in zip(coefficients, fragments):
+        if coefficient == 0:
+            continue
+        product = fragment if coefficient == 1 else fragment.translate(_MUL_TABLES[coefficient])
+        result ^= int.from_bytes(product, 'little')
+    return result.to_bytes(size, 'little')
+
+def _invert(matrix):
+    n = len(matrix)
+    rows = [list(row) + [1 if i == j else 0 for j in range(n)] for i, row in enumerate(matrix)]
+    for col in range(n):
+        pivot = next((r for r in range(col, n) if rows[r][col]), None)
+        if pivot is None:
+            raise ValueError("Fragment matrix is singular")
+        rows[col], rows[pivot] = rows[pivot], rows[col]
+        scale = gf_inv(rows[col][col])
+        rows[col] = [gf_mul(scale, v) for v in rows[col]]
+        for r in range(n):
+            if r != col and rows[r][col]:
+                factor = rows[r][col]
+                rows[r] = [v ^ gf_mul(factor, p) for v, p in zip(rows[r], rows[col])]
+    return [row[n:] for row in rows]
+
+class ReedSolomon:
+    def __init__(self, k, m):
+        if k < 1 or m < 0 or k + m > 256:
+            raise ValueError("Reed-Solomon needs 1 <= k and k + m <= 256")
+        self.k = k
+        self.m = m
+        self.parity_matrix = [[gf_inv((k + i) ^ j) for j in range(k)] for i in range(m)]
+
+    def fragment_size(self, length):
+        return max(1, -(-length // self.k))
+
+    def _generator_row(self, index):
+        if index < self.k:
+            return [1 if j == index else 0 for j in range(self.k)]
+        return self.parity_matrix[index - self.k]
+
+    def encode(self, data):
+        """Returns the k data fragments followed by the m parity fragments for data."""
+        size = self.fragment_size(len(data))
+        data = data.ljust(size * self.k, b'\0')
+        fragments = [data[i * size:(i + 1) * size] for i in range(self.k)]
+        for row in self.parity_matrix:
+            fragments.append(_linear_combination(row, fragments[:self.k], size))
+        return fragments
+
+    def decode(self, fragments, length):
+        """Rebuilds the original data from a dict of {fragment index: fragment bytes}."""
+        if len(fragments) < self.k:
+            raise ValueError(f"Need {self.k} fragments to decode, got {len(fragments)}")
+        if all(i in fragments for i in range(self.k)):
+            return b''.join(fragments[i] for i in range(self.k))[:length]
+
+        # Prefer surviving data fragments, then fill up with parity.
+        indices = sorted(fragments, key=lambda i: (i >= self.k, i))[:self.k]
+        size = len(fragments[indices[0]])
+        available = [fragments[i] for i in indices]
+        inverse = _invert([self._generator_row(i) for i in indices])
+        data = [fragments[j] if j in fragments else _linear_combination(inverse[j], available, size)
+                for j in range(self.k)]
+        return b''.join(data)[:length]
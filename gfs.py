@@ -0,0 +1,284 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import config
+from client import GFSClient
+
+GFS_PREFIX = "gfs:"
+
+class Manifest:
+    """Per-file progress of a copy, saved so an interrupted copy can resume.
+
+    A file is identified by its size (and mtime for local sources); if either
+    changed since the manifest was written, the file is copied from scratch.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.files = {}
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                self.files = json.load(f)['files']
+
+    def start(self, name, size, mtime):
+        with self.lock:
+            state = self.files.get(name)
+            if not state or state['size'] != size or state['mtime'] != mtime:
+                state = self.files[name] = {'size': size, 'mtime': mtime, 'chunks': [], 'complete': False}
+            return state['complete'], set(state['chunks'])
+
+    def chunk_done(self, name, chunk_index):
+        with self.lock:
+            self.files[name]['chunks'].append(chunk_index)
+
+    def file_done(self, name):
+        with self.lock:
+            self.files[name]['complete'] = True
+            self.files[name]['chunks'] = []
+
+    def save(self):
+        with self.lock:
+            data = json.dumps({'files': self.files})
+        with open(self.path + '.tmp', 'w') as f:
+            f.write(data)
+        os.replace(self.path + '.tmp', self.path)
+
+class Progress:
+    def __init__(self, total_files, total_bytes):
+        self.lock = threading.Lock()
+        self.start = time.time()
+        self.total_files = total_files
+        self.total_bytes = total_bytes
+        self.files = 0
+        self.bytes = 0
+        self.copied_bytes = 0
+
+    def add(self, files=0, nbytes=0, copied=True):
+        with self.lock:
+            self.files += files
+            self.bytes += nbytes
+            if copied:
+                self.copied_bytes += nbytes
+
+    def line(self):
+        with self.lock:
+            elapsed = max(time.time() - self.start, 1e-9)
+            return (f"{self.files}/{self.total_files} files, {self.bytes / 2**20:,.1f}/{self.total_bytes / 2**20:,.1f} MB, "
+                    f"{self.copied_bytes / 2**20 / elapsed:,.1f} MB/s")
+
+class Copy:
+    """Copies a directory tree into GFS or out of it, many chunks at a time.
+
+    Every chunk is checked end to end: the crc32 of the local bytes must match
+    the crc32 each chunk server computes over the bytes it stores, for every
+    replica or, for erasure-coded chunks, every data fragment holding them.
+    """
+
+    def __init__(self, client, manifest, workers, retries):
+        self.client = client
+        self.manifest = manifest
+        self.workers = workers
+        self.retries = retries
+        self.lock = threading.Lock()
+        self.remaining = {}
+        self.failed = set()
+
+    def _chunk_count(self, size):
+        return (size + config.CHUNK_SIZE_BYTES - 1) // config.CHUNK_SIZE_BYTES
+
+    def _chunk_range(self, size, chunk_index):
+        offset = chunk_index * config.CHUNK_SIZE_BYTES
+        return offset, min(config.CHUNK_SIZE_BYTES, size - offset)
+
+    def _verified(self, gfs_name, offset, data):
+        # Chunk servers apply writes from a queue, so a new chunk may take a moment to show up.
+        deadline = time.time() + config.CLIENT_READ_TIMEOUT_SECONDS
+        while True:
+            if self.client.verify(gfs_name, offset, data):
+                return True
+            if time.time() > deadline:
+                return False
+            time.sleep(0.05)
+
+    def import_chunk(self, local_path, gfs_name, size, chunk_index):
+        offset, length = self._chunk_range(size, chunk_index)
+        with open(local_path, 'rb') as f:
+            f.seek(offset)
+            data = f.read(length)
+        for _ in range(self.retries):
+            if self.client.write(gfs_name, data, offset=offset) and self._verified(gfs_name, offset, data):
+                return True
+        return False
+
+    def export_chunk(self, gfs_name, local_path, size, chunk_index):
+        offset, length = self._chunk_range(size, chunk_index)
+        for _ in range(self.retries):
+            data = self.client.read_bytes(gfs_name, offset, length)
+            if data is None or not self.client.verify(gfs_name, offset, data):
+                continue
+            with open(local_path, 'r+b') as f:
+                f.seek(offset)
+                # Bytes a chunk does not hold (padding left by record appends) read as zeros.
+                f.write(data.ljust(length, b'\0'))
+            return True
+        return False
+
+    def import_tree(self, source, destination):
+        entries = []
+        for root, _, filenames in os.walk(source):
+            for filename in sorted(filenames):
+                local_path = os.path.join(root, filename)
+                relative = os.path.relpath(local_path, source).replace(os.sep, '/')
+                stat = os.stat(local_path)
+                entries.append((relative, local_path, f"{destination.rstrip('/')}/{relative}", stat.st_size, stat.st_mtime))
+
+        def prepare(relative, local_path, gfs_name, size):
+            if not self.client.create(gfs_name) and self.client.get_file_info(gfs_name, consistent=True) is None:
+                return None
+            return lambda chunk_index: self.import_chunk(local_path, gfs_name, size, chunk_index)
+
+        def finish(relative, local_path, gfs_name, size):
+            return self.client.update_file_length(gfs_name, size)
+
+        return self._run(entries, prepare, finish)
+
+    def export_tree(self, source, destination):
+        prefix = source.rstrip('/') + '/'
+        entries = []
+        for gfs_name in sorted(self.client.ls(prefix) or []):
+            info = self.client.get_file_info(gfs_name, consistent=True)
+            if info is None:
+                print(f"Error: could not get file info for {gfs_name}")
+                self.failed.add(gfs_name)
+                continue
+            relative = gfs_name[len(prefix):]
+            parts = relative.split('/')
+            if any(part in ('', '.', '..') or os.sep in part or (os.altsep and os.altsep in part) for part in parts):
+                # GFS names are arbitrary strings; none may land outside the destination.
+                print(f"Error: {gfs_name} does not map to a path inside {destination}")
+                self.failed.add(gfs_name)
+                continue
+            entries.append((relative, gfs_name, os.path.join(destination, *parts), info['length'], None))
+
+        def prepare(relative, gfs_name, local_path, size):
+            os.makedirs(os.path.dirname(local_path) or '.', exist_ok=True)
+            # A file that is being resumed keeps the chunks already written.
+            with open(local_path, 'r+b' if os.path.exists(local_path) else 'wb') as f:
+                f.truncate(size)
+            return lambda chunk_index: self.export_chunk(gfs_name, local_path, size, chunk_index)
+
+        return self._run(entries, prepare, lambda *entry: True)
+
+    def _run(self, entries, prepare, finish):
+        progress = Progress(len(entries) + len(self.failed), sum(entry[3] for entry in entries))
+        done = threading.Event()
+
+        def report():
+            while not done.wait(1):
+                self.manifest.save()
+                print(f"\r{progress.line()}", end='', flush=True)
+
+        reporter = threading.Thread(target=report, daemon=True)
+        reporter.start()
+
+        def tasks():
+            # Chunk tasks of every file share one pool, so small files and
+            # the chunks of large ones are all in flight together.
+            for relative, src, dst, size, mtime in entries:
+                complete, done_chunks = self.manifest.start(relative, size, mtime)
+                if complete:
+                    progress.add(files=1, nbytes=size, copied=False)
+                    continue
+                copy_chunk = prepare(relative, src, dst, size)
+                if copy_chunk is None:
+                    print(f"\nError: could not create {dst}")
+                    self.failed.add(relative)
+                    continue
+                todo = [i for i in range(self._chunk_count(size)) if i not in done_chunks]
+                progress.add(nbytes=sum(self._chunk_range(size, i)[1] for i in done_chunks), copied=False)
+                with self.lock:
+                    self.remaining[relative] = len(todo)
+                if not todo:
+                    self._file_done(relative, src, dst, size, finish, progress)
+                for chunk_index in todo:
+                    yield (relative, src, dst, size, chunk_index, copy_chunk)
+
+        def run_task(relative, src, dst, size, chunk_index, copy_chunk):
+            if relative in self.failed:
+                return
+            if not copy_chunk(chunk_index):
+                print(f"\nError: chunk {chunk_index} of {relative} failed verification")
+                self.failed.add(relative)
+                return
+            self.manifest.chunk_done(relative, chunk_index)
+            progress.add(nbytes=self._chunk_range(size, chunk_index)[1])
+            with self.lock:
+                self.remaining[relative] -= 1
+                last = self.remaining[relative] == 0
+            if last:
+                self._file_done(relative, src, dst, size, finish, progress)
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            in_flight = set()
+            for task in tasks():
+                if len(in_flight) >= self.workers * 2:
+                    _, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                in_flight.add(pool.submit(run_task, *task))
+            wait(in_flight)
+
+        done.set()
+        reporter.join()
+        self.manifest.save()
+        print(f"\r{progress.line()}, {len(self.failed)} failed")
+        return not self.failed
+
+    def _file_done(self, relative, src, dst, size, finish, progress):
+        if finish(relative, src, dst, size):
+            self.manifest.file_done(relative)
+            progress.add(files=1)
+        else:
+            print(f"\nError: could not finalize {dst}")
+            self.failed.add(relative)
+
+def cp(args):
+    if args.source.startswith(GFS_PREFIX) == args.destination.startswith(GFS_PREFIX):
+        print("Error: exactly one of source and destination must be a gfs: path")
+        return False
+    manifest_path = args.manifest or f".gfs_cp_{zlib.crc32(f'{args.source}->{args.destination}'.encode()):08x}.json"
+    copy = Copy(GFSClient(), Manifest(manifest_path), args.workers, args.retries)
+    if args.destination.startswith(GFS_PREFIX):
+        if not os.path.isdir(args.source):
+            print(f"Error: {args.source} is not a directory")
+            return False
+        ok = copy.import_tree(args.source, args.destination[len(GFS_PREFIX):])
+    else:
+        ok = copy.export_tree(args.source[len(GFS_PREFIX):], args.destination)
+    if ok:
+        os.remove(manifest_path)
+    else:
+        print(f"Copy incomplete; run the same command again to resume from {manifest_path}")
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description="GFS command line tools")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    copy = commands.add_parser('cp', help="copy a local directory tree into GFS (gfs:/path) or out of it")
+    copy.add_argument('source')
+    copy.add_argument('destination')
+    copy.add_argument('--workers', type=int, default=32, help="chunks in flight at once")
+    copy.add_argument('--retries', type=int, default=3)
+    copy.add_argument('--manifest', help="progress file used to resume an interrupted copy")
+    copy.set_defaults(run=cp)
+
+    args = parser.parse_args()
+    sys.exit(0 if args.run(args) else 1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+import io
+import config
+
+MODES = {'r': 'rb', 'rb': 'rb', 'w': 'wb', 'wb': 'wb', 'a': 'ab', 'ab': 'ab'}
+
+def open_file(client, filename, mode='rb', buffering=-1):
+    """Opens a GFS file the way the built-in open() opens a local one.
+
+    Binary read modes return an io.BufferedReader, binary write modes the raw
+    GFSFile (which buffers writes itself) and text modes an io.TextIOWrapper.
+    """
+    if mode not in MODES:
+        raise ValueError(f"invalid mode: {mode!r}")
+    raw = GFSFile(client, filename, MODES[mode])
+    if MODES[mode] == 'rb':
+        binary = io.BufferedReader(raw, buffering if buffering > 0 else io.DEFAULT_BUFFER_SIZE)
+    else:
+        binary = raw
+    if 'b' in mode:
+        return binary
+    return io.TextIOWrapper(binary, encoding='utf-8', write_through=True)
+
+class GFSFile(io.RawIOBase):
+    """Seekable raw file object over one GFS file.
+
+    Reads that continue where the previous one ended are served from whole
+    chunks, and the next CLIENT_READ_AHEAD_CHUNKS chunks are fetched in the
+    background. Any other read fetches just the range asked for. Writes are
+    buffered and sent one chunk at a time, when the buffer reaches a chunk
+    boundary and on flush(). In 'ab' mode each flushed piece is a record
+    append, so appenders sharing a file never overwrite each other.
+    """
+
+    def __init__(self, client, filename, mode, read_ahead=config.CLIENT_READ_AHEAD_CHUNKS):
+        super().__init__()
+        self.client = client
+        self.filename = filename
+        self.mode = mode
+        self.read_ahead = read_ahead
+        self.position = 0
+        self.sequential_end = 0
+        self.prefetched = {}
+        self.buffer = bytearray()
+        self.buffer_offset = 0
+
+        info = client.get_file_info(filename, consistent=True)
+        if info is None:
+            if mode == 'rb':
+                raise FileNotFoundError(f"No such GFS file: {filename}")
+            if not client.create(filename):
+                raise OSError(f"Could not create GFS file: {filename}")
+            info = {'length': 0}
+        self.length = info['length']
+        # GFS cannot truncate a file; 'wb' resets its length and overwrites it from the start.
+        if mode == 'wb' and self.length:
+            self.length = 0
+            if not client.update_file_length(filename, 0):
+                raise OSError(f"Could not truncate GFS file: {filename}")
+        if mode == 'ab':
+            self.position = self.buffer_offset = self.length
+
+    def readable(self):
+        return self.mode == 'rb'
+
+    def writable(self):
+        return self.mode != 'rb'
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += self._length()
+        elif whence != io.SEEK_SET:
+            raise ValueError(f"invalid whence: {whence}")
+        if offset < 0:
+            raise ValueError(f"negative seek position {offset}")
+        self.position = offset
+        return self.position
+
+    def _length(self):
+        return max(self.length, self.buffer_offset + len(self.buffer))
+
+    def readinto(self, b):
+        if self.position >= self.length:
+            # The file may have grown since it was opened.
+            info = self.client.get_file_info(self.filename, consistent=True)
+            self.length = info['length'] if info else self.length
+            if self.position >= self.length:
+                return 0
+        chunk_index, chunk_offset = divmod(self.position, config.CHUNK_SIZE_BYTES)
+        size = min(len(b), self.length - self.position, config.CHUNK_SIZE_BYTES - chunk_offset)
+
+        if self.position == self.sequential_end:
+            data = self._chunk(chunk_index)[chunk_offset:chunk_offset + size]
+        else:
+            self.prefetched.clear()
+            data = self.client.read_bytes(self.filename, self.position, size)
+            if data is None:
+                raise OSError(f"Could not read {self.filename} at offset {self.position}")
+        if len(data) < size:
+            # Only a chunk the file continues past can end early: the rest of it is
+            # padding left by a record append that did not fit, and reads as zeros.
+            if chunk_index == (self.length - 1) // config.CHUNK_SIZE_BYTES:
+                raise OSError(f"Short read of {self.filename} at offset {self.position}")
+            data = data.ljust(size, b'\0')
+        b[:size] = data
+        self.position += size
+        self.sequential_end = self.position
+        return size
+
+    def _fetch_chunk(self, chunk_index):
+        return self.client.read_bytes(self.filename, chunk_index * config.CHUNK_SIZE_BYTES, config.CHUNK_SIZE_BYTES)
+
+    def _chunk(self, chunk_index):
+        for stale in [i for i in self.prefetched if i < chunk_index]:
+            del self.prefetched[stale]
+        last_chunk = (self.length - 1) // config.CHUNK_SIZE_BYTES
+        for i in range(chunk_index, min(chunk_index + self.read_ahead, last_chunk) + 1):
+            if i not in self.prefetched:
+                self.prefetched[i] = self.client.read_ahead_pool.submit(self._fetch_chunk, i)
+        data = self.prefetched[chunk_index].result()
+        if data is None:
+            del self.prefetched[chunk_index]
+            raise OSError(f"Could not read chunk {chunk_index} of {self.filename}")
+        return data
+
+    def write(self, b):
+        if not self.writable():
+            raise io.UnsupportedOperation("not writable")
+        if self.mode == 'ab':
+            # Appends always go to the end of the file, wherever it is by then.
+            self.buffer += b
+            self.position += len(b)
+            while len(self.buffer) >= config.CHUNK_SIZE_BYTES:
+                self._append_out(config.CHUNK_SIZE_BYTES)
+            return len(b)
+        if self.position != self.buffer_offset + len(self.buffer):
+            self.flush()
+            self.buffer_offset = self.position
+        self.buffer += b
+        self.position += len(b)
+
+        # Every full piece up to a chunk boundary is written as soon as it is complete.
+        while True:
+            boundary = (self.buffer_offset // config.CHUNK_SIZE_BYTES + 1) * config.CHUNK_SIZE_BYTES
+            if self.buffer_offset + len(self.buffer) < boundary:
+                break
+            self._write_out(boundary - self.buffer_offset)
+        return len(b)
+
+    def _write_out(self, size):
+        if not self.client.write(self.filename, bytes(self.buffer[:size]), offset=self.buffer_offset):
+            raise OSError(f"Could not write {self.filename} at offset {self.buffer_offset}")
+        del self.buffer[:size]
+        self.buffer_offset += size
+        if self.buffer_offset > self.length:
+            if not self.client.update_file_length(self.filename, self.buffer_offset):
+                raise OSError(f"Could not update the length of {self.filename}")
+            self.length = self.buffer_offset
+
+    def _append_out(self, size):
+        offset = self.client.record_append(self.filename, bytes(self.buffer[:size]))
+        if offset is None:
+            raise OSError(f"Could not append to {self.filename}")
+        del self.buffer[:size]
+        self.buffer_offset = offset + size
+        self.length = max(self.length, self.buffer_offset)
+        self.position = self.buffer_offset + len(self.buffer)
+
+    def flush(self):
+        if self.buffer and not self.closed:
+            if self.mode == 'ab':
+                self._append_out(len(self.buffer))
+            else:
+                self._write_out(len(self.buffer))
+        super().flush()
+
+    def close(self):
+        if not self.closed:
+            try:
+                self.flush()
+            finally:
+                self.prefetched.clear()
+                super().close()
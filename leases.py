@@ -0,0 +1,46 @@
+import heapq
+
+class LeaseTable:
+    """Chunk leases with a min-heap ordered by expiry.
+
+    Extending a lease pushes a new heap entry instead of updating the old one;
+    stale heap entries are skipped when they reach the top.
+    """
+
+    def __init__(self):
+        self.leases = {}
+        self.expiry_heap = []
+
+    def grant(self, chunk_handle, holder, expiry):
+        self.leases[chunk_handle] = (holder, expiry)
+        heapq.heappush(self.expiry_heap, (expiry, chunk_handle))
+
+    def holder(self, chunk_handle, now):
+        holder, expiry = self.leases.get(chunk_handle, (None, 0))
+        return holder if expiry > now else None
+
+    def expiry(self, chunk_handle):
+        return self.leases.get(chunk_handle, (None, 0))[1]
+
+    def extend(self, chunk_handle, holder, now, expiry):
+        if self.holder(chunk_handle, now) != holder:
+            return False
+        self.grant(chunk_handle, holder, expiry)
+        return True
+
+    def revoke(self, chunk_handle):
+        self.leases.pop(chunk_handle, None)
+
+    def expire(self, now):
+        """Drops every lease that has expired by now and returns their (chunk_handle, holder) pairs."""
+        expired = []
+        while self.expiry_heap and self.expiry_heap[0][0] <= now:
+            expiry, chunk_handle = heapq.heappop(self.expiry_heap)
+            holder, current_expiry = self.leases.get(chunk_handle, (None, None))
+            if current_expiry == expiry:
+                del self.leases[chunk_handle]
+                expired.append((chunk_handle, holder))
+        return expired
+
+    def __len__(self):
+        return len(self.leases)
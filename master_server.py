@@ -3,19 +3,27 @@ import time
 import random
 import json
 import os
+import base64
+import requests
 from flask import Flask, request, jsonify
 import config
+import compression
+from erasure import ReedSolomon
+from metadata import ChunkTable, FileRecord, save_checkpoint, load_checkpoint, apply_operation, erasure_coded_locations
+from leases import LeaseTable
 
 app = Flask(__name__)
 
 class GFSMaster():
     def __init__(self):
         self.files = {}
-        self.chunks = {}
+        self.chunks = ChunkTable()
         self.chunk_servers = {}
-        self.next_chunk_handle = 0
-        self.file_to_chunks = {}
-        self.chunk_leases = {}
+        self.leases = LeaseTable()
+        # Per chunk server: lease grants to deliver with the next heartbeat response.
+        # New chunk versions are resent until confirmed (see ChunkTable.pending_versions).
+        self.lease_notices = {}
+        self.pending_deletes = []
         self.lock = threading.RLock()
         self.op_log_file = config.OPERATION_LOG
 
@@ -24,61 +32,183 @@ class GFSMaster():
         # Background threads
         threading.Thread(target=self.monitor_chunk_servers, daemon=True).start()
         threading.Thread(target=self.garbage_collection, daemon=True).start()
+        threading.Thread(target=self.erasure_coding_job, daemon=True).start()
+        threading.Thread(target=self.checkpoint_job, daemon=True).start()
 
     def load_metadata(self):
+        log_offset = 0
         if os.path.exists(config.METADATA_STORE):
-            with open(config.METADATA_STORE, 'r') as f:
-                data = json.load(f)
-                self.files = data.get('files', {})
-                self.chunks = data.get('chunks', {})
-                self.file_to_chunks = data.get('file_to_chunks', {})
-                self.next_chunk_handle = data.get('next_chunk_handle', 0)
+            self.files, self.chunks, log_offset, _ = load_checkpoint(config.METADATA_STORE)
+            # Older checkpoints did not place fragments; they must not look like orphans.
+            for layout in self.chunks.erasure.values():
+                for fragment_handle, server_id in layout['fragments']:
+                    self.chunks.set_replicas(fragment_handle, [server_id])
+        self.replay_operation_log(log_offset)
+
+    def replay_operation_log(self, offset):
+        # Lease grants and stale replicas are only logged, so everything the
+        # log holds past the checkpoint is applied on top of it.
+        if not os.path.exists(self.op_log_file):
+            return 0
+        if os.path.getsize(self.op_log_file) < offset:
+            offset = 0
+        with open(self.op_log_file, 'rb') as f:
+            f.seek(offset)
+            data = f.read()
+        complete = data[:data.rfind(b'\n') + 1]
+        if len(complete) < len(data):
+            # Drop an entry torn by a crash mid-write so new entries start on their own line.
+            os.truncate(self.op_log_file, offset + len(complete))
+        entries = [json.loads(line) for line in complete.splitlines() if line.strip()]
+        for entry in entries:
+            apply_operation(self.files, self.chunks, entry)
+            if entry['op'] == 'grant_lease':
+                self.chunks.pending_versions[int(entry['chunk_handle'])] = {s: entry['version'] for s in entry.get('replicas', [])}
+        return len(entries)
 
     def save_metadata(self):
         with self.lock:
-            with open(config.METADATA_STORE, 'w') as f:
-                data = {
-                    'files': self.files,
-                    'chunks': self.chunks,
-                    'file_to_chunks': self.file_to_chunks,
-                    'next_chunk_handle': self.next_chunk_handle
-                }
-                json.dump(data, f)
+            # Operations are logged under the lock, so the log's size marks where this checkpoint ends.
+            log_offset = os.path.getsize(self.op_log_file) if os.path.exists(self.op_log_file) else 0
+            ports = {server_id: info['port'] for server_id, info in self.chunk_servers.items()}
+            save_checkpoint(config.METADATA_STORE, self.files, self.chunks, log_offset, ports)
 
     def log_operation(self, op, **kwargs):
         with open(self.op_log_file, 'a') as f:
             log_entry = json.dumps({'op': op, 'timestamp': time.time(), **kwargs})
             f.write(log_entry + '\n')
 
-    def register_chunk_server(self, port, data_dir):
+    def register_chunk_server(self, port, data_dir, host='127.0.0.1'):
         with self.lock:
-            server_id = f"{request.remote_addr}:{port}"
+            server_id = f"{host}:{port}"
             self.chunk_servers[server_id] = {
                 'last_heartbeat': time.time(),
                 'port': port,
                 'data_dir': data_dir,
-                'chunks': []
+                'chunks': [],
+                'load': 0
             }
             self.log_operation('register_chunk_server', server_id=server_id, port=port, data_dir=data_dir)
             return server_id
 
-    def handle_heartbeat(self, server_id, chunk_report):
+    def handle_heartbeat(self, server_id, chunk_report, lease_extensions=(), load=0):
         with self.lock:
             if server_id in self.chunk_servers:
-                self.chunk_servers[server_id]['last_heartbeat'] = time.time()
-                self.chunk_servers[server_id]['chunks'] = chunk_report
-                return {'status': 'ok'}
+                now = time.time()
+                self.chunk_servers[server_id]['last_heartbeat'] = now
+                self.chunk_servers[server_id]['load'] = load
+                self.chunk_servers[server_id]['chunks'] = list(chunk_report)
+
+                leases = self.lease_notices.pop(server_id, {})
+                for chunk_handle in lease_extensions:
+                    chunk_handle = int(chunk_handle)
+                    if self.leases.extend(chunk_handle, server_id, now, now + config.LEASE_TIME_SECONDS):
+                        leases[chunk_handle] = now + config.LEASE_TIME_SECONDS
+                stale = []
+                if isinstance(chunk_report, dict):
+                    self._confirm_versions(server_id, chunk_report)
+                    stale = self._detect_stale_replicas(server_id, chunk_report)
+                self._collect_orphans(server_id, chunk_report)
+                versions = {h: pending[server_id] for h, pending in self.chunks.pending_versions.items() if server_id in pending}
+                return {
+                    'status': 'ok',
+                    'versions': {str(h): v for h, v in versions.items()},
+                    'leases': {str(h): expiry - now for h, expiry in leases.items() if h not in stale},
+                    'stale': stale
+                }
             else:
                 return {'status': 're-register'}
 
-    def create_file(self, filename):
+    def _schedule_delete(self, server_id, chunk_handle):
+        if (server_id, chunk_handle) not in self.pending_deletes:
+            self.pending_deletes.append((server_id, chunk_handle))
+
+    def _collect_orphans(self, server_id, chunk_report):
+        # Deletions are not persisted: every replica a server reports that the
+        # metadata no longer places on it (such as the replicas of a chunk that
+        # was erasure-coded before a restart) is garbage and is deleted again.
+        for chunk_handle in chunk_report:
+            if not str(chunk_handle).isdigit():
+                continue
+            chunk_handle = int(chunk_handle)
+            if chunk_handle not in self.chunks or server_id not in self.chunks.replicas(chunk_handle):
+                self._schedule_delete(server_id, chunk_handle)
+
+    def _confirm_versions(self, server_id, chunk_report):
+        # A version notice is resent with every heartbeat until the replica
+        # reports that version, so a lost response or a master restart cannot
+        # turn an up-to-date replica into a stale one.
+        for chunk_handle, pending in list(self.chunks.pending_versions.items()):
+            if server_id in pending and chunk_report.get(str(chunk_handle), -1) >= pending[server_id]:
+                del pending[server_id]
+                if not pending:
+                    del self.chunks.pending_versions[chunk_handle]
+
+    def _detect_stale_replicas(self, server_id, chunk_report):
+        # A replica that missed a version bump (it was down when a lease was
+        # granted) reports an older version than the master and is dropped.
+        stale = []
+        for chunk_handle, version in chunk_report.items():
+            if not str(chunk_handle).isdigit():
+                continue
+            chunk_handle = int(chunk_handle)
+            if chunk_handle not in self.chunks or server_id in self.chunks.pending_versions.get(chunk_handle, {}):
+                continue
+            replicas = self.chunks.replicas(chunk_handle)
+            if server_id not in replicas:
+                continue
+            if version > self.chunks.version(chunk_handle):
+                # The master crashed before persisting a version it handed out.
+                self.chunks.set_version(chunk_handle, version)
+            elif version < self.chunks.version(chunk_handle):
+                if not any(s in self.chunk_servers for s in replicas if s != server_id):
+                    # Never drop the last live copy: bring it up to date instead.
+                    print(f"Chunk {chunk_handle} on {server_id} is stale but is the only live replica; keeping it.")
+                    self.chunks.pending_versions.setdefault(chunk_handle, {})[server_id] = self.chunks.version(chunk_handle)
+                    continue
+                replicas.remove(server_id)
+                self.chunks.set_replicas(chunk_handle, replicas)
+                if self.leases.holder(chunk_handle, time.time()) == server_id:
+                    self.leases.revoke(chunk_handle)
+                self._schedule_delete(server_id, chunk_handle)
+                self.log_operation('stale_replica', chunk_handle=chunk_handle, server_id=server_id, version=version)
+                stale.append(chunk_handle)
+        return stale
+
+    def _grant_lease(self, chunk_handle):
+        live = [s for s in self.chunks.replicas(chunk_handle) if s in self.chunk_servers]
+        if not live:
+            return None
+        # Granting a lease bumps the chunk version. Live replicas learn the new
+        # version with their next heartbeat; replicas that miss it become stale.
+        primary_server_id = random.choice(live)
+        version = self.chunks.version(chunk_handle) + 1
+        self.chunks.set_version(chunk_handle, version)
+        expiry = time.time() + config.LEASE_TIME_SECONDS
+        self.leases.grant(chunk_handle, primary_server_id, expiry)
+        self.chunks.pending_versions[chunk_handle] = {server_id: version for server_id in live}
+        self.lease_notices.setdefault(primary_server_id, {})[chunk_handle] = expiry
+        self.log_operation('grant_lease', chunk_handle=chunk_handle, primary=primary_server_id, version=version, replicas=live)
+        return primary_server_id
+
+    def _replica_locations(self, filename, chunk_handle, primary_server_id):
+        live = [s for s in self.chunks.replicas(chunk_handle) if s in self.chunk_servers]
+        return {
+            'chunk_handle': chunk_handle,
+            'locations': [self.chunk_servers[s]['port'] for s in live],
+            'loads': [self.chunk_servers[s]['load'] for s in live],
+            'primary': self.chunk_servers[primary_server_id]['port'] if primary_server_id in self.chunk_servers else None,
+            'version': self.chunks.version(chunk_handle),
+            'codec': self.files[filename].codec
+        }
+
+    def create_file(self, filename, codec=None, storage_class=None):
         with self.lock:
             if filename in self.files:
                 return None
-            self.files[filename] = {'length': 0, 'chunks': {}}
-            self.file_to_chunks[filename] = []
-            self.log_operation('create_file', filename=filename)
-            self.save_metadata()
+            storage_class = storage_class or config.DEFAULT_STORAGE_CLASS
+            self.files[filename] = FileRecord(storage_class, time.time(), codec)
+            self.log_operation('create_file', filename=filename, codec=codec, storage_class=storage_class)
             return self.files[filename]
 
     def allocate_chunk(self, filename, chunk_index):
@@ -86,52 +216,41 @@ class GFSMaster():
             if filename not in self.files:
                 return None
 
-            chunk_handle = str(self.next_chunk_handle)
-            self.next_chunk_handle += 1
-
             available_servers = list(self.chunk_servers.keys())
             if len(available_servers) < config.REPLICATION_FACTOR:
                 return None
 
             replicas = random.sample(available_servers, config.REPLICATION_FACTOR)
-            self.chunks[chunk_handle] = {'replicas': replicas, 'version': 0}
-            self.files[filename]['chunks'][chunk_index] = chunk_handle
-            self.file_to_chunks[filename].append(chunk_handle)
-
-            primary_server_id = replicas[0]
-            lease_expiry = time.time() + config.LEASE_TIME_SECONDS
-            self.chunk_leases[chunk_handle] = (primary_server_id, lease_expiry)
+            chunk_handle = self.chunks.allocate(replicas)
+            self.files[filename].set_chunk(int(chunk_index), chunk_handle)
+            self.files[filename].mtime = time.time()
 
             self.log_operation('allocate_chunk', filename=filename, chunk_index=chunk_index, chunk_handle=chunk_handle, replicas=replicas)
-            self.save_metadata()
+            primary_server_id = self._grant_lease(chunk_handle)
 
-            return {
-                'chunk_handle': chunk_handle,
-                'locations': [self.chunk_servers[s]['port'] for s in replicas],
-                'primary': self.chunk_servers[primary_server_id]['port']
-            }
+            return self._replica_locations(filename, chunk_handle, primary_server_id)
 
-    def get_chunk_locations(self, filename, chunk_index):
+    def get_chunk_locations(self, filename, chunk_index, mutation=True):
+        # Only mutations need a primary; plain reads never grant a lease.
         with self.lock:
-            if filename not in self.files or str(chunk_index) not in self.files[filename]['chunks']:
+            if filename not in self.files:
                 return None
-
-            chunk_handle = self.files[filename]['chunks'][str(chunk_index)]
-            chunk_info = self.chunks.get(chunk_handle)
-            if not chunk_info:
+            chunk_handle = self.files[filename].chunk_handle(int(chunk_index))
+            if chunk_handle is None:
                 return None
+            if chunk_handle in self.chunks.erasure:
+                return erasure_coded_locations(chunk_handle, self.chunks.erasure[chunk_handle], self.files[filename].codec,
+                                               lambda server_id: self.chunk_servers.get(server_id, {}).get('port'))
 
-            primary_server_id, lease_expiry = self.chunk_leases.get(chunk_handle, (None, 0))
-            if time.time() > lease_expiry:
-                primary_server_id = chunk_info['replicas'][0]
-                lease_expiry = time.time() + config.LEASE_TIME_SECONDS
-                self.chunk_leases[chunk_handle] = (primary_server_id, lease_expiry)
+            primary_server_id = self.leases.holder(chunk_handle, time.time())
+            if mutation:
+                # Writes go straight to the chunk servers, so the lookup is the
+                # master's only sign that the file is being modified.
+                self.files[filename].mtime = time.time()
+                if primary_server_id is None:
+                    primary_server_id = self._grant_lease(chunk_handle)
 
-            return {
-                'chunk_handle': chunk_handle,
-                'locations': [self.chunk_servers[s]['port'] for s in chunk_info['replicas']],
-                'primary': self.chunk_servers[primary_server_id]['port']
-            }
+            return self._replica_locations(filename, chunk_handle, primary_server_id)
 
     def monitor_chunk_servers(self):
         while True:
@@ -145,24 +264,126 @@ class GFSMaster():
                 for server_id in dead_servers:
                     print(f"Chunk server {server_id} is down.")
                     del self.chunk_servers[server_id]
+                    self.lease_notices.pop(server_id, None)
                     self.log_operation('server_down', server_id=server_id)
+                self.leases.expire(now)
 
     def garbage_collection(self):
         # In a real implementation, this would be more sophisticated
-        pass
+        while True:
+            time.sleep(config.HEARTBEAT_INTERVAL_SECONDS)
+            self.delete_garbage()
+
+    def delete_garbage(self):
+        with self.lock:
+            garbage, self.pending_deletes = self.pending_deletes, []
+            ports = {server_id: self.chunk_servers[server_id]['port'] for server_id, _ in garbage if server_id in self.chunk_servers}
+        for server_id, chunk_handle in garbage:
+            if server_id not in ports:
+                continue
+            try:
+                requests.post(f"http://127.0.0.1:{ports[server_id]}/delete", json={'chunk_handle': chunk_handle}, timeout=5)
+            except requests.exceptions.RequestException:
+                with self.lock:
+                    self.pending_deletes.append((server_id, chunk_handle))
+
+    def checkpoint_job(self):
+        while True:
+            time.sleep(config.CHECKPOINT_INTERVAL_SECONDS)
+            self.save_metadata()
+
+    def erasure_coding_job(self):
+        while True:
+            time.sleep(config.ERASURE_CODING_SCAN_INTERVAL_SECONDS)
+            self.convert_cold_files()
+
+    def convert_cold_files(self):
+        with self.lock:
+            cutoff = time.time() - config.COLD_FILE_AGE_SECONDS
+            # Encoded chunks are read-only, so only full chunks are encoded and
+            # the chunk an append would go to stays replicated.
+            candidates = [(filename, chunk_handle)
+                          for filename, record in self.files.items()
+                          if record.storage_class == 'erasure' and record.mtime < cutoff
+                          for chunk_handle in map(record.chunk_handle, range(record.length // config.CHUNK_SIZE_BYTES))
+                          if chunk_handle is not None and chunk_handle not in self.chunks.erasure
+                          and self.leases.holder(chunk_handle, time.time()) is None]
+        return sum(1 for filename, chunk_handle in candidates if self.encode_chunk(filename, chunk_handle))
+
+    def encode_chunk(self, filename, chunk_handle):
+        rs = ReedSolomon(config.ERASURE_DATA_FRAGMENTS, config.ERASURE_PARITY_FRAGMENTS)
+        with self.lock:
+            replicas = self.chunks.replicas(chunk_handle)
+            sources = [s for s in replicas if s in self.chunk_servers]
+            if not sources or len(self.chunk_servers) < rs.k + rs.m:
+                return False
+            mtime = self.files[filename].mtime
+            source_port = self.chunk_servers[sources[0]]['port']
+            targets = random.sample(list(self.chunk_servers.keys()), rs.k + rs.m)
+            target_ports = [self.chunk_servers[s]['port'] for s in targets]
+            # Fragments are placed right away so heartbeats do not report them as orphans.
+            fragment_handles = [self.chunks.allocate([server_id]) for server_id in targets]
+
+        # The chunk data is copied without holding the metadata lock.
+        try:
+            response = requests.get(f"http://127.0.0.1:{source_port}/read", params={
+                'chunk_handle': chunk_handle,
+                'encoding': 'base64'
+            }, timeout=10)
+            if response.status_code != 200:
+                return False
+            data = base64.b64decode(response.json()['data'])
+            for fragment_handle, port, fragment in zip(fragment_handles, target_ports, rs.encode(data)):
+                requests.post(f"http://127.0.0.1:{port}/write", json={
+                    'chunk_handle': fragment_handle,
+                    'data': base64.b64encode(fragment).decode('ascii'),
+                    'encoding': 'base64',
+                    'offset': 0
+                }, timeout=10).raise_for_status()
+        except requests.exceptions.RequestException:
+            self._discard_fragments(fragment_handles, targets)
+            return False
+
+        with self.lock:
+            if (filename not in self.files or self.files[filename].mtime != mtime or chunk_handle in self.chunks.erasure
+                    or self.leases.holder(chunk_handle, time.time()) is not None):
+                # The file was written to while encoding; try again once it is cold.
+                self._discard_fragments(fragment_handles, targets)
+                return False
+            layout = {
+                'k': rs.k,
+                'm': rs.m,
+                'length': len(data),
+                'fragments': [[handle, server_id] for handle, server_id in zip(fragment_handles, targets)]
+            }
+            self.chunks.erasure[chunk_handle] = layout
+            for server_id in self.chunks.replicas(chunk_handle):
+                self._schedule_delete(server_id, chunk_handle)
+            self.chunks.pending_versions.pop(chunk_handle, None)
+            self.chunks.set_replicas(chunk_handle, [])
+            self.leases.revoke(chunk_handle)
+            self.log_operation('erasure_encode_chunk', chunk_handle=chunk_handle, erasure=layout)
+            self.save_metadata()
+            return True
+
+    def _discard_fragments(self, fragment_handles, targets):
+        with self.lock:
+            for fragment_handle, server_id in zip(fragment_handles, targets):
+                self.chunks.set_replicas(fragment_handle, [])
+                self._schedule_delete(server_id, fragment_handle)
 
     def get_file_info(self, filename):
         with self.lock:
             if filename in self.files:
-                return {'length': self.files[filename]['length']}
+                return {'length': self.files[filename].length}
             return None
 
     def update_file_length(self, filename, length):
         with self.lock:
             if filename in self.files:
-                self.files[filename]['length'] = length
+                self.files[filename].length = length
+                self.files[filename].mtime = time.time()
                 self.log_operation('update_file_length', filename=filename, length=length)
-                self.save_metadata()
                 return True
             return False
 
@@ -171,21 +392,28 @@ master = GFSMaster()
 @app.route('/register', methods=['POST'])
 def register():
     data = request.json
-    server_id = master.register_chunk_server(data['port'], data['data_dir'])
+    server_id = master.register_chunk_server(data['port'], data['data_dir'], request.remote_addr)
     return jsonify({'server_id': server_id})
 
 @app.route('/heartbeat', methods=['POST'])
 def heartbeat():
     data = request.json
-    result = master.handle_heartbeat(data['server_id'], data['chunk_report'])
+    result = master.handle_heartbeat(data['server_id'], data['chunk_report'], data.get('lease_extensions', []), data.get('load', 0))
     return jsonify(result)
 
 @app.route('/create', methods=['POST'])
 def create():
     print("--- Received create request ---")
     filename = request.json['filename']
+    try:
+        codec = compression.validate_codec(request.json.get('codec'))
+    except ValueError:
+        return jsonify({'error': 'unknown_codec'}), 400
+    storage_class = request.json.get('storage_class')
+    if storage_class not in (None, 'replicated', 'erasure'):
+        return jsonify({'error': 'unknown_storage_class'}), 400
     print(f"--- Creating file: {filename} ---")
-    if master.create_file(filename) is not None:
+    if master.create_file(filename, codec, storage_class) is not None:
         print(f"--- File {filename} created successfully ---")
         return jsonify({'status': 'created'})
     else:
@@ -196,7 +424,8 @@ def create():
 def get_chunk_locations():
     filename = request.args['filename']
     chunk_index = str(request.args['chunk_index'])
-    locations = master.get_chunk_locations(filename, chunk_index)
+    mutation = request.args.get('mutation') == '1'
+    locations = master.get_chunk_locations(filename, chunk_index, mutation)
     if locations:
         return jsonify(locations)
     else:
@@ -0,0 +1,230 @@
+import os
+import json
+import mmap
+import struct
+from array import array
+import config
+
+NO_CHUNK = -1
+
+class FileRecord:
+    __slots__ = ('length', 'chunks', 'storage_class', 'mtime', 'codec')
+
+    def __init__(self, storage_class, mtime, codec=None, length=0, chunks=None):
+        self.length = length
+        # chunks[i] is the handle of chunk index i, or NO_CHUNK for a hole.
+        self.chunks = chunks if chunks is not None else array('q')
+        self.storage_class = storage_class
+        self.mtime = mtime
+        self.codec = codec
+
+    def chunk_handle(self, chunk_index):
+        if 0 <= chunk_index < len(self.chunks) and self.chunks[chunk_index] != NO_CHUNK:
+            return self.chunks[chunk_index]
+        return None
+
+    def set_chunk(self, chunk_index, chunk_handle):
+        if chunk_index >= len(self.chunks):
+            self.chunks.extend([NO_CHUNK] * (chunk_index + 1 - len(self.chunks)))
+        self.chunks[chunk_index] = chunk_handle
+
+    def chunk_handles(self):
+        return [handle for handle in self.chunks if handle != NO_CHUNK]
+
+class ChunkTable:
+    """Column-oriented chunk metadata indexed by integer chunk handle.
+
+    Each chunk costs a 4-byte version and a 4-byte id into a pool of interned
+    replica sets, which stays small because many chunks share the same servers.
+    Erasure-coded layouts are rare and kept in a plain dict, as are version
+    bumps that some replicas have not confirmed yet.
+    """
+
+    def __init__(self):
+        self.versions = array('I')
+        self.replica_set_ids = array('I')
+        self.replica_sets = [()]
+        self._replica_set_pool = {(): 0}
+        self.erasure = {}
+        # chunk handle -> {server_id: version} still to be confirmed by that replica
+        self.pending_versions = {}
+
+    def __len__(self):
+        return len(self.versions)
+
+    def __contains__(self, chunk_handle):
+        return 0 <= chunk_handle < len(self.versions)
+
+    def _intern(self, replicas):
+        replicas = tuple(replicas)
+        set_id = self._replica_set_pool.get(replicas)
+        if set_id is None:
+            set_id = len(self.replica_sets)
+            self.replica_sets.append(replicas)
+            self._replica_set_pool[replicas] = set_id
+        return set_id
+
+    def allocate(self, replicas=()):
+        self.versions.append(0)
+        self.replica_set_ids.append(self._intern(replicas))
+        return len(self.versions) - 1
+
+    def replicas(self, chunk_handle):
+        return list(self.replica_sets[self.replica_set_ids[chunk_handle]])
+
+    def set_replicas(self, chunk_handle, replicas):
+        self.replica_set_ids[chunk_handle] = self._intern(replicas)
+
+    def version(self, chunk_handle):
+        return self.versions[chunk_handle]
+
+    def set_version(self, chunk_handle, version):
+        self.versions[chunk_handle] = version
+
+# Checkpoint layout: header, JSON section (files, replica set pool, erasure
+# layouts, chunk server ports, and the operation log offset the checkpoint
+# covers), then the version and replica-set-id columns and every file's chunk
+# handle array as raw machine arrays, in the order the JSON lists the files.
+CHECKPOINT_MAGIC = b'GFSCKPT1'
+CHECKPOINT_HEADER = struct.Struct('<8sQQ')
+
+def save_checkpoint(path, files, chunks, log_offset=0, chunk_servers=None):
+    names = list(files)
+    meta = json.dumps({
+        'files': [[name, files[name].length, files[name].storage_class, files[name].mtime,
+                   files[name].codec, len(files[name].chunks)] for name in names],
+        'replica_sets': chunks.replica_sets,
+        'erasure': {str(handle): layout for handle, layout in chunks.erasure.items()},
+        'pending_versions': {str(handle): pending for handle, pending in chunks.pending_versions.items()},
+        'log_offset': log_offset,
+        'chunk_servers': chunk_servers or {}
+    }).encode('utf-8')
+    with open(path + '.tmp', 'wb') as f:
+        f.write(CHECKPOINT_HEADER.pack(CHECKPOINT_MAGIC, len(chunks), len(meta)))
+        f.write(meta)
+        chunks.versions.tofile(f)
+        chunks.replica_set_ids.tofile(f)
+        for name in names:
+            files[name].chunks.tofile(f)
+    os.replace(path + '.tmp', path)
+
+def load_checkpoint(path):
+    """Returns (files, chunks, log_offset, chunk_servers) from a checkpoint, or from a legacy JSON metadata store.
+
+    log_offset is the size the operation log had when the checkpoint was taken;
+    entries past it are not reflected in the checkpoint. chunk_servers maps the
+    servers alive at that time to their ports.
+    """
+    with open(path, 'rb') as f:
+        if f.read(len(CHECKPOINT_MAGIC)) != CHECKPOINT_MAGIC:
+            f.seek(0)
+            return _load_legacy_json(json.load(f)) + (0, {})
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            _, chunk_count, meta_length = CHECKPOINT_HEADER.unpack_from(mm, 0)
+            position = CHECKPOINT_HEADER.size
+            meta = json.loads(mm[position:position + meta_length])
+            position += meta_length
+
+            def take(typecode, count):
+                nonlocal position
+                column = array(typecode)
+                column.frombytes(mm[position:position + count * column.itemsize])
+                position += count * column.itemsize
+                return column
+
+            chunks = ChunkTable()
+            chunks.versions = take('I', chunk_count)
+            chunks.replica_set_ids = take('I', chunk_count)
+            chunks.replica_sets = [tuple(replicas) for replicas in meta['replica_sets']]
+            chunks._replica_set_pool = {replicas: i for i, replicas in enumerate(chunks.replica_sets)}
+            chunks.erasure = {int(handle): layout for handle, layout in meta['erasure'].items()}
+            chunks.pending_versions = {int(handle): pending for handle, pending in meta.get('pending_versions', {}).items()}
+
+            files = {}
+            for name, length, storage_class, mtime, codec, chunk_count in meta['files']:
+                files[name] = FileRecord(storage_class, mtime, codec, length, take('q', chunk_count))
+    return files, chunks, meta.get('log_offset', 0), meta.get('chunk_servers', {})
+
+def _ensure_handle(chunks, chunk_handle):
+    while len(chunks) <= chunk_handle:
+        chunks.allocate()
+
+def apply_operation(files, chunks, entry):
+    """Applies one operation log entry to the namespace and chunk table.
+
+    Every operation is idempotent, so replaying the log over a newer
+    checkpoint converges on the master's state. Chunk server membership is
+    not part of the metadata and is left to the caller.
+    """
+    op = entry['op']
+    if op == 'create_file':
+        if entry['filename'] not in files:
+            files[entry['filename']] = FileRecord(entry.get('storage_class') or config.DEFAULT_STORAGE_CLASS,
+                                                  entry['timestamp'], entry.get('codec'))
+    elif op == 'allocate_chunk':
+        chunk_handle = int(entry['chunk_handle'])
+        _ensure_handle(chunks, chunk_handle)
+        if chunk_handle not in chunks.erasure:
+            chunks.set_replicas(chunk_handle, entry['replicas'])
+        if entry['filename'] in files:
+            files[entry['filename']].set_chunk(int(entry['chunk_index']), chunk_handle)
+            files[entry['filename']].mtime = entry['timestamp']
+    elif op == 'grant_lease':
+        chunk_handle = int(entry['chunk_handle'])
+        _ensure_handle(chunks, chunk_handle)
+        chunks.set_version(chunk_handle, max(chunks.version(chunk_handle), entry['version']))
+    elif op == 'stale_replica':
+        chunk_handle = int(entry['chunk_handle'])
+        _ensure_handle(chunks, chunk_handle)
+        chunks.set_replicas(chunk_handle, [s for s in chunks.replicas(chunk_handle) if s != entry['server_id']])
+    elif op == 'update_file_length':
+        if entry['filename'] in files:
+            files[entry['filename']].length = entry['length']
+            files[entry['filename']].mtime = entry['timestamp']
+    elif op == 'erasure_encode_chunk':
+        chunk_handle = int(entry['chunk_handle'])
+        layout = entry['erasure']
+        _ensure_handle(chunks, max([chunk_handle] + [handle for handle, _ in layout['fragments']]))
+        chunks.erasure[chunk_handle] = layout
+        chunks.set_replicas(chunk_handle, [])
+        chunks.pending_versions.pop(chunk_handle, None)
+        for fragment_handle, server_id in layout['fragments']:
+            chunks.set_replicas(fragment_handle, [server_id])
+
+def erasure_coded_locations(chunk_handle, layout, codec, port_of):
+    """Builds the get_chunk_locations response for an erasure-coded chunk.
+
+    port_of maps a server id to its port, or to None when the server is down,
+    which tells the client to rebuild that fragment from the surviving ones.
+    """
+    return {
+        'chunk_handle': chunk_handle,
+        'locations': [],
+        'primary': None,
+        'codec': codec,
+        'erasure': {
+            'k': layout['k'],
+            'm': layout['m'],
+            'length': layout['length'],
+            'fragments': [{'chunk_handle': handle, 'port': port_of(server_id)} for handle, server_id in layout['fragments']]
+        }
+    }
+
+def _load_legacy_json(data):
+    chunks = ChunkTable()
+    for _ in range(data.get('next_chunk_handle', 0)):
+        chunks.allocate()
+    for handle, info in data.get('chunks', {}).items():
+        chunks.set_replicas(int(handle), info.get('replicas', []))
+        chunks.set_version(int(handle), info.get('version', 0))
+        if 'erasure' in info:
+            layout = dict(info['erasure'])
+            layout['fragments'] = [[int(fragment), server_id] for fragment, server_id in layout['fragments']]
+            chunks.erasure[int(handle)] = layout
+    files = {}
+    for name, info in data.get('files', {}).items():
+        record = FileRecord(info.get('storage_class', 'replicated'), info.get('mtime', 0), info.get('codec'), info.get('length', 0))
+        for chunk_index, handle in info.get('chunks', {}).items():
+            record.set_chunk(int(chunk_index), int(handle))
+        files[name] = record
+    return files, chunks
@@ -0,0 +1,68 @@
+import threading
+import time
+from collections import deque
+import config
+
+class ReplicaSelector:
+    """Orders a chunk's replicas by observed latency and reported load.
+
+    Each chunk server has an exponentially weighted moving average of its read
+    latency and the load it last reported (reads in flight plus queued
+    mutations), keeping whichever load sample was measured last. Servers
+    without samples sort first so they get measured.
+    hedge_delay() is the latency percentile after which a read is hedged.
+    """
+
+    MIN_SAMPLES = 20
+
+    def __init__(self, alpha=config.CLIENT_LATENCY_EWMA_ALPHA, percentile=config.CLIENT_HEDGE_PERCENTILE, window=512):
+        self.alpha = alpha
+        self.percentile = percentile
+        self.lock = threading.Lock()
+        self.latency = {}
+        self.load = {}
+        self.load_measured_at = {}
+        self.samples = deque(maxlen=window)
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def record(self, port, seconds):
+        with self.lock:
+            previous = self.latency.get(port)
+            self.latency[port] = seconds if previous is None else self.alpha * seconds + (1 - self.alpha) * previous
+            self.samples.append(seconds)
+
+    def report_load(self, port, load, measured_at=None):
+        measured_at = time.time() if measured_at is None else measured_at
+        with self.lock:
+            if measured_at >= self.load_measured_at.get(port, 0):
+                self.load[port] = load
+                self.load_measured_at[port] = measured_at
+
+    def score(self, port):
+        with self.lock:
+            return self.latency.get(port, 0.0) * (1 + self.load.get(port, 0))
+
+    def order(self, ports):
+        return sorted(ports, key=self.score)
+
+    def hedge_delay(self):
+        with self.lock:
+            if len(self.samples) < self.MIN_SAMPLES:
+                return config.CLIENT_HEDGE_INITIAL_DELAY_SECONDS
+            ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, len(ordered) * self.percentile // 100)]
+
+    def record_hedge(self, won):
+        with self.lock:
+            self.hedges += 1
+            self.hedge_wins += 1 if won else 0
+
+    def stats(self):
+        with self.lock:
+            return {
+                'hedges': self.hedges,
+                'hedge_wins': self.hedge_wins,
+                'latency_ewma': dict(self.latency),
+                'load': dict(self.load)
+            }
@@ -0,0 +1,136 @@
+import threading
+import time
+import json
+import os
+import sys
+from flask import Flask, request, jsonify
+import config
+from metadata import ChunkTable, load_checkpoint, apply_operation, erasure_coded_locations
+
+app = Flask(__name__)
+
+class GFSShadowMaster():
+    """Read-only replica of the master's namespace and chunk locations.
+
+    The shadow loads the master's last checkpoint and then tails its operation
+    log from the offset the checkpoint covers, so it lags the primary by at most SHADOW_LOG_POLL_INTERVAL_SECONDS.
+    It never allocates chunks or grants leases.
+    """
+
+    def __init__(self, op_log_file=config.OPERATION_LOG, metadata_store=config.METADATA_STORE):
+        self.files = {}
+        self.chunks = ChunkTable()
+        self.chunk_servers = {}
+        self.lock = threading.RLock()
+        self.op_log_file = op_log_file
+        self.log_offset = 0
+        self.last_applied = 0
+
+        if os.path.exists(metadata_store):
+            self.files, self.chunks, self.log_offset, self.chunk_servers = load_checkpoint(metadata_store)
+        self.poll_operation_log()
+
+        threading.Thread(target=self.tail_operation_log, daemon=True).start()
+
+    def tail_operation_log(self):
+        while True:
+            time.sleep(config.SHADOW_LOG_POLL_INTERVAL_SECONDS)
+            self.poll_operation_log()
+
+    def poll_operation_log(self):
+        if not os.path.exists(self.op_log_file):
+            return 0
+        if os.path.getsize(self.op_log_file) < self.log_offset:
+            # The log was replaced since the checkpoint; replay it from the start.
+            self.log_offset = 0
+        with open(self.op_log_file, 'rb') as f:
+            f.seek(self.log_offset)
+            data = f.read()
+        # Only whole lines are applied; a partially written entry is picked up next time.
+        complete = data[:data.rfind(b'\n') + 1]
+        entries = [json.loads(line) for line in complete.splitlines() if line.strip()]
+        with self.lock:
+            for entry in entries:
+                self.apply(entry)
+            self.log_offset += len(complete)
+        return len(entries)
+
+    def apply(self, entry):
+        op = entry['op']
+        if op == 'register_chunk_server':
+            self.chunk_servers[entry['server_id']] = entry['port']
+        elif op == 'server_down':
+            self.chunk_servers.pop(entry['server_id'], None)
+        else:
+            apply_operation(self.files, self.chunks, entry)
+        self.last_applied = entry['timestamp']
+
+    def get_chunk_locations(self, filename, chunk_index):
+        with self.lock:
+            if filename not in self.files:
+                return None
+            chunk_handle = self.files[filename].chunk_handle(int(chunk_index))
+            if chunk_handle is None:
+                return None
+            if chunk_handle in self.chunks.erasure:
+                return erasure_coded_locations(chunk_handle, self.chunks.erasure[chunk_handle],
+                                               self.files[filename].codec, self.chunk_servers.get)
+            ports = [self.chunk_servers[s] for s in self.chunks.replicas(chunk_handle) if s in self.chunk_servers]
+            if not ports:
+                return None
+            # Shadows do not know the lease holder; readers never need it.
+            return {
+                'chunk_handle': chunk_handle,
+                'locations': ports,
+                'primary': None,
+                'codec': self.files[filename].codec
+            }
+
+    def get_file_info(self, filename):
+        with self.lock:
+            if filename in self.files:
+                return {'length': self.files[filename].length}
+            return None
+
+    def ls(self, path):
+        with self.lock:
+            all_files = list(self.files.keys())
+        if path == '/':
+            return all_files
+        return [f for f in all_files if f.startswith(path)]
+
+shadow = None
+
+@app.route('/get_chunk_locations', methods=['GET'])
+def get_chunk_locations():
+    locations = shadow.get_chunk_locations(request.args['filename'], request.args['chunk_index'])
+    if locations:
+        return jsonify(locations)
+    # Unknown or not yet replayed: the client falls back to the primary.
+    return jsonify({'error': 'chunk_not_found'}), 404
+
+@app.route('/ls', methods=['GET'])
+def ls():
+    return jsonify(shadow.ls(request.args.get('path', '/')))
+
+@app.route('/get_file_info', methods=['GET'])
+def get_file_info():
+    info = shadow.get_file_info(request.args['filename'])
+    if info:
+        return jsonify(info)
+    else:
+        return jsonify({'error': 'file_not_found'}), 404
+
+@app.route('/status', methods=['GET'])
+def status():
+    return jsonify({'log_offset': shadow.log_offset, 'last_applied_timestamp': shadow.last_applied})
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2:
+        print("Usage: python shadow_master.py <port>")
+        sys.exit(1)
+
+    port = int(sys.argv[1])
+    shadow = GFSShadowMaster()
+    print(f"--- Starting shadow master on {config.MASTER_HOST}:{port} ---")
+    app.run(host=config.MASTER_HOST, port=port, debug=True, use_reloader=False)
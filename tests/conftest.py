@@ -0,0 +1,79 @@
+import pytest
+import sys
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from master_server import GFSMaster
+from client import GFSClient
+import config
+
+@pytest.fixture
+def master():
+    # Clean up metadata before each test
+    if os.path.exists(config.METADATA_STORE):
+        os.remove(config.METADATA_STORE)
+    if os.path.exists(config.OPERATION_LOG):
+        os.remove(config.OPERATION_LOG)
+    return GFSMaster()
+
+class InMemoryClient:
+    """Stands in for GFSClient, keeping every file in one bytearray."""
+
+    def __init__(self):
+        self.files = {}
+        self.reads = []
+        self.writes = []
+        # chunk index -> where that chunk's data ends, to model chunks shorter than the file
+        self.chunk_ends = {}
+        # corrupt: writes store X bytes instead of the data; unverifiable: verify() always fails.
+        self.corrupt = False
+        self.unverifiable = False
+        self.read_ahead_pool = ThreadPoolExecutor(max_workers=4)
+
+    def get_file_info(self, filename, consistent=False):
+        if filename not in self.files:
+            return None
+        return {'length': self.files[filename]['length']}
+
+    def create(self, filename):
+        if filename in self.files:
+            return False
+        self.files[filename] = {'data': bytearray(), 'length': 0}
+        return True
+
+    def update_file_length(self, filename, length):
+        self.files[filename]['length'] = length
+        return True
+
+    def ls(self, path):
+        return [f for f in self.files if f.startswith(path)]
+
+    def write(self, filename, data, offset=0):
+        content = self.files[filename]['data']
+        if len(content) < offset:
+            content.extend(b'\0' * (offset - len(content)))
+        content[offset:offset + len(data)] = b'X' * len(data) if self.corrupt else data
+        self.writes.append((filename, offset, len(data)))
+        return True
+
+    def read_bytes(self, filename, offset=0, length=-1):
+        self.reads.append((filename, offset, length))
+        data = bytes(self.files[filename]['data'][offset:offset + length])
+        chunk_index, chunk_offset = divmod(offset, config.CHUNK_SIZE_BYTES)
+        if chunk_index in self.chunk_ends:
+            data = data[:max(0, self.chunk_ends[chunk_index] - chunk_offset)]
+        return data
+
+    def verify(self, filename, offset, data):
+        if self.unverifiable:
+            return False
+        return bytes(self.files[filename]['data'][offset:offset + len(data)]) == data
+
+    record_append = GFSClient.record_append
+    open = GFSClient.open
+
+@pytest.fixture
+def memory_client():
+    return InMemoryClient()
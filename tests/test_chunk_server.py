@@ -1,8 +1,11 @@
 import pytest
+import requests_mock
 import sys
 import os
 import shutil
 import json
+import base64
+import time
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
@@ -57,3 +60,86 @@ def test_load_and_save_metadata(chunk_server_instance):
     
     assert chunk_handle in new_server.chunks
     assert new_server.chunks[chunk_handle]['version'] == 1
+
+def test_compressed_write_and_range_read(chunk_server_instance):
+    chunk_handle = "test_handle_4"
+    data_to_write = "log line\n" * 4000
+
+    chunk_server_instance._handle_write({'chunk_handle': chunk_handle, 'data': data_to_write, 'offset': 0, 'codec': 'zlib'})
+    chunk_server_instance._handle_write({'chunk_handle': chunk_handle, 'data': "OVERWRITE", 'offset': 10000})
+
+    expected = data_to_write[:10000] + "OVERWRITE" + data_to_write[10009:]
+    assert chunk_server_instance.chunks[chunk_handle]['codec'] == 'zlib'
+    assert chunk_server_instance.read_chunk(chunk_handle) == expected
+    assert chunk_server_instance.read_chunk(chunk_handle, 9995, 20) == expected[9995:10015]
+
+    stats = chunk_server_instance.get_stats()
+    assert stats['raw_bytes'] == len(expected)
+    assert stats['compression_ratio'] > 5
+
+def test_compressed_append(chunk_server_instance):
+    chunk_handle = "test_handle_5"
+    chunk_server_instance._handle_write({'chunk_handle': chunk_handle, 'data': "First part.", 'offset': 0, 'codec': 'lzma'})
+    chunk_server_instance._handle_append({'request_id': 'req2', 'chunk_handle': chunk_handle, 'data': " Second part."})
+
+    assert chunk_server_instance.read_chunk(chunk_handle) == "First part. Second part."
+
+def test_read_chunk_compressed_returns_touched_blocks(chunk_server_instance):
+    chunk_handle = "test_handle_6"
+    data_to_write = "abcdefgh" * 4096
+    chunk_server_instance._handle_write({'chunk_handle': chunk_handle, 'data': data_to_write, 'offset': 0, 'codec': 'zlib'})
+
+    body = chunk_server_instance.read_chunk_compressed(chunk_handle, 100, 50)
+    assert body['codec'] == 'zlib'
+    assert len(body['blocks']) == 1
+    assert body['skip'] == 100 and body['length'] == 50
+
+def test_binary_write_and_delete(chunk_server_instance):
+    chunk_handle = "test_handle_7"
+    payload = bytes(range(256))
+    chunk_server_instance._handle_write({'chunk_handle': chunk_handle, 'data': base64.b64encode(payload).decode('ascii'),
+                                         'encoding': 'base64', 'offset': 0})
+    assert chunk_server_instance.read_chunk_bytes(chunk_handle, 16, 32) == payload[16:48]
+
+    chunk_server_instance.delete_chunk(chunk_handle)
+    assert chunk_handle not in chunk_server_instance.chunks
+    assert chunk_server_instance.read_chunk_bytes(chunk_handle) is None
+
+def test_segment_storage_backend(chunk_server_instance):
+    server = GFSChunkServer(port=50003, data_dir=chunk_server_instance.data_dir, storage_backend='segment')
+    server._handle_write({'chunk_handle': "test_handle_8", 'data': "packed " * 3000, 'offset': 0, 'codec': 'zlib'})
+    server._handle_write({'chunk_handle': "test_handle_9", 'data': "plain", 'offset': 0})
+    server._handle_append({'request_id': 'req3', 'chunk_handle': "test_handle_9", 'data': " chunk"})
+
+    assert server.read_chunk("test_handle_8", 7, 6) == "packed"
+    assert server.read_chunk("test_handle_9") == "plain chunk"
+    assert not os.path.exists(os.path.join(server.data_dir, "test_handle_9"))
+
+def test_heartbeat_applies_versions_and_leases(chunk_server_instance):
+    chunk_handle = "7"
+    chunk_server_instance._handle_write({'chunk_handle': chunk_handle, 'data': "leased", 'offset': 0, 'version': 1})
+    chunk_server_instance.apply_heartbeat_response({'status': 'ok', 'versions': {chunk_handle: 2}, 'leases': {chunk_handle: 60}, 'stale': []})
+    assert chunk_server_instance.chunks[chunk_handle]['version'] == 2
+
+    heartbeat = chunk_server_instance.build_heartbeat()
+    assert heartbeat['chunk_report'] == {chunk_handle: 2}
+    assert heartbeat['lease_extensions'] == [chunk_handle]
+
+    # A delayed write carrying the old version does not roll the chunk back.
+    chunk_server_instance._handle_write({'chunk_handle': chunk_handle, 'data': "L", 'offset': 0, 'version': 1})
+    assert chunk_server_instance.chunks[chunk_handle]['version'] == 2
+
+def test_heartbeat_versions_do_not_create_chunks(chunk_server_instance):
+    chunk_server_instance.apply_heartbeat_response({'status': 'ok', 'versions': {"8": 3}, 'leases': {}, 'stale': []})
+    assert "8" not in chunk_server_instance.chunks
+    assert chunk_server_instance.build_heartbeat()['chunk_report'] == {}
+
+def test_reregisters_when_master_forgets_the_server(chunk_server_instance):
+    chunk_server_instance.server_id = "127.0.0.1:50001"
+    chunk_server_instance.leases = {"7": time.time() + 60}
+    with requests_mock.Mocker() as m:
+        m.post(f"{chunk_server_instance.master_url}/register", json={'server_id': "127.0.0.1:50001"})
+        chunk_server_instance.apply_heartbeat_response({'status': 're-register'})
+        assert m.call_count == 1
+    assert chunk_server_instance.server_id == "127.0.0.1:50001"
+    assert chunk_server_instance.leases == {}
@@ -1,11 +1,17 @@
 import pytest
+import requests
 import requests_mock
 import sys
 import os
+import time
+import base64
+import zlib
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from client import GFSClient
+from erasure import ReedSolomon
+from append_buffer import BufferedAppender
 import config
 
 @pytest.fixture
@@ -74,3 +80,191 @@ def test_ls_success(client, master_url):
         m.get(f"{master_url}/ls", json=["/file1.txt", "/file2.txt"], status_code=200)
         files = client.ls("/")
         assert files == ["/file1.txt", "/file2.txt"]
+
+def test_read_compressed_blocks(master_url):
+    client = GFSClient(accept_compressed=True)
+    block = base64.b64encode(zlib.compress(b"0123456789")).decode('ascii')
+    with requests_mock.Mocker() as m:
+        m.get(f"{master_url}/get_chunk_locations", json={
+            'chunk_handle': '123',
+            'locations': [50001],
+            'primary': 50001
+        }, status_code=200)
+        m.get("http://127.0.0.1:50001/read", json={'codec': 'zlib', 'skip': 2, 'length': 5, 'blocks': [block]}, status_code=200)
+        assert client.read("/testfile.txt", offset=2, length=5) == "23456"
+        assert m.request_history[-1].qs['compressed'] == ['1']
+
+def test_degraded_erasure_coded_read(client, master_url):
+    data = b"erasure coded content"
+    fragments = ReedSolomon(2, 1).encode(data)
+    with requests_mock.Mocker() as m:
+        m.get(f"{master_url}/get_chunk_locations", json={
+            'chunk_handle': '123',
+            'locations': [],
+            'primary': None,
+            'erasure': {'k': 2, 'm': 1, 'length': len(data), 'fragments': [
+                {'chunk_handle': '200', 'port': None},
+                {'chunk_handle': '201', 'port': 50002},
+                {'chunk_handle': '202', 'port': 50003}
+            ]}
+        }, status_code=200)
+        m.get("http://127.0.0.1:50002/read", json={'data': base64.b64encode(fragments[1]).decode('ascii')})
+        m.get("http://127.0.0.1:50003/read", json={'data': base64.b64encode(fragments[2]).decode('ascii')})
+        assert client.read("/testfile.txt") == data.decode('utf-8')
+        assert client.write("/testfile.txt", "x") is False
+
+def test_metadata_reads_use_shadows(master_url):
+    client = GFSClient(shadow_urls=["http://127.0.0.1:50060", "http://127.0.0.1:50061"])
+    with requests_mock.Mocker() as m:
+        m.get("http://127.0.0.1:50060/ls", exc=requests.exceptions.ConnectionError)
+        m.get("http://127.0.0.1:50061/ls", json=["/file1.txt"], status_code=200)
+        m.get("http://127.0.0.1:50060/get_chunk_locations", status_code=404)
+        m.get("http://127.0.0.1:50061/get_chunk_locations", status_code=404)
+        m.get(f"{master_url}/get_chunk_locations", json={'chunk_handle': 123, 'locations': [50001], 'primary': 50001})
+        m.get(f"{master_url}/get_file_info", json={'length': 5}, status_code=200)
+
+        assert client.ls("/") == ["/file1.txt"]
+        assert client._get_chunk_locations("/file1.txt", 0)['chunk_handle'] == 123
+        assert client.get_file_info("/file1.txt", consistent=True) == {'length': 5}
+        info_requests = [r for r in m.request_history if r.path == '/get_file_info']
+        assert len(info_requests) == 1 and info_requests[0].port == config.MASTER_PORT
+
+def test_record_append_does_not_straddle_chunks(client, master_url):
+    with requests_mock.Mocker() as m:
+        m.get(f"{master_url}/get_file_info", json={'length': config.CHUNK_SIZE_BYTES - 2}, status_code=200)
+        m.get(f"{master_url}/get_chunk_locations", json={
+            'chunk_handle': '124',
+            'locations': [50001],
+            'primary': 50001
+        }, status_code=200)
+        m.post("http://127.0.0.1:50001/write", status_code=200)
+        m.post(f"{master_url}/update_file_length", status_code=200)
+        assert client.record_append("/testfile.txt", "hello") == config.CHUNK_SIZE_BYTES
+        write = [r for r in m.request_history if r.path == '/write'][0]
+        assert write.json()['offset'] == 0
+        assert m.request_history[-1].json()['length'] == config.CHUNK_SIZE_BYTES + 5
+
+class RecordingClient:
+    def __init__(self):
+        self.length = 0
+        self.batches = []
+
+    def record_append(self, filename, data):
+        offset = self.length
+        self.length += len(data)
+        self.batches.append((filename, data))
+        return offset
+
+def test_buffered_appender_batches_records():
+    recording = RecordingClient()
+    with BufferedAppender(recording, max_batch_bytes=250, max_delay=60) as appender:
+        futures = [appender.append("/log.txt", f"record {i:02d}\n") for i in range(100)]
+        assert appender.flush() is True
+        assert [f.result() for f in futures] == [i * 10 for i in range(100)]
+    assert len(recording.batches) == 4
+    assert b''.join(data for _, data in recording.batches) == ''.join(f"record {i:02d}\n" for i in range(100)).encode('utf-8')
+
+def test_buffered_appender_takes_bytes_and_non_ascii_records():
+    recording = RecordingClient()
+    with BufferedAppender(recording, max_batch_bytes=1024, max_delay=60) as appender:
+        futures = [appender.append("/log.txt", b"\x00\xffraw"), appender.append("/log.txt", "Zoë\n"), appender.append("/log.txt", "end")]
+        assert appender.flush() is True
+        # "Zoë\n" is five bytes once encoded, not four characters.
+        assert [f.result() for f in futures] == [0, 5, 10]
+    assert recording.batches == [("/log.txt", b"\x00\xffrawZo\xc3\xab\nend")]
+
+def test_buffered_appender_flushes_after_delay():
+    recording = RecordingClient()
+    appender = BufferedAppender(recording, max_batch_bytes=1024, max_delay=0.01)
+    future = appender.append("/log.txt", "late record")
+    assert future.result(timeout=5) == 0
+    assert appender.close() is True
+    with pytest.raises(ValueError):
+        appender.append("/log.txt", "after close")
+
+class SlowReplicaClient(GFSClient):
+    # requests_mock serializes requests across threads, so replica reads are stubbed here.
+    def _read_replica(self, port, params):
+        time.sleep(0.3 if port == 50001 else 0.001)
+        self.replica_selector.record(port, 0.3 if port == 50001 else 0.001)
+        return {'data': f"copy from {port}"}
+
+def test_slow_replica_read_is_hedged(master_url):
+    client = SlowReplicaClient()
+    client.replica_selector.record(50001, 0.001)
+    client.replica_selector.record(50002, 0.002)
+    with requests_mock.Mocker() as m:
+        m.get(f"{master_url}/get_chunk_locations", json={
+            'chunk_handle': '123',
+            'locations': [50002, 50001],
+            'loads': [3, 0],
+            'primary': 50001
+        }, status_code=200)
+        start = time.perf_counter()
+        assert client.read("/testfile.txt") == 'copy from 50002'
+        assert time.perf_counter() - start < 0.3
+    stats = client.replica_selector.stats()
+    assert stats['hedges'] == 1 and stats['hedge_wins'] == 1
+    assert stats['load'] == {50002: 3, 50001: 0}
+
+class FailingClient:
+    def __init__(self):
+        self.calls = 0
+
+    def record_append(self, filename, data):
+        self.calls += 1
+        if self.calls == 1:
+            raise RuntimeError("master unreachable")
+        return 0
+
+def test_buffered_appender_survives_failing_batch():
+    failing = FailingClient()
+    appender = BufferedAppender(failing, max_batch_bytes=1024, max_delay=60)
+    first = appender.append("/log.txt", "lost")
+    assert appender.flush() is False
+    assert first.result(timeout=5) is None
+    second = appender.append("/log.txt", "kept")
+    assert appender.close() is True
+    assert second.result(timeout=5) == 0
+
+def test_write_fails_when_no_replica_accepts(client, master_url):
+    with requests_mock.Mocker() as m:
+        m.get(f"{master_url}/get_chunk_locations", json={
+            'chunk_handle': '123',
+            'locations': [50001, 50002],
+            'primary': 50001
+        }, status_code=200)
+        m.post("http://127.0.0.1:50001/write", exc=requests.exceptions.ConnectionError)
+        m.post("http://127.0.0.1:50002/write", exc=requests.exceptions.ConnectionError)
+        assert client.write("/testfile.txt", "hello") is False
+
+def test_verify_requires_every_replica_to_match(client, master_url):
+    with requests_mock.Mocker() as m:
+        m.get(f"{master_url}/get_chunk_locations", json={'chunk_handle': '123', 'locations': [50001, 50002], 'primary': 50001})
+        m.get("http://127.0.0.1:50001/checksum", json={'crc32': zlib.crc32(b"hello"), 'length': 5})
+        m.get("http://127.0.0.1:50002/checksum", status_code=404)
+        assert client.verify("/testfile.txt", 0, b"hello") is False
+        m.get("http://127.0.0.1:50002/checksum", json={'crc32': zlib.crc32(b"hello"), 'length': 5})
+        assert client.verify("/testfile.txt", 0, b"hello") is True
+        assert client.verify("/testfile.txt", 0, b"jello") is False
+
+def test_verify_erasure_coded_chunk_against_fragments(client, master_url):
+    data = b"erasure coded content"
+    fragments = ReedSolomon(2, 1).encode(data)
+    with requests_mock.Mocker() as m:
+        m.get(f"{master_url}/get_chunk_locations", json={
+            'chunk_handle': '123',
+            'locations': [],
+            'primary': None,
+            'erasure': {'k': 2, 'm': 1, 'length': len(data), 'fragments': [
+                {'chunk_handle': '200', 'port': 50001},
+                {'chunk_handle': '201', 'port': 50002},
+                {'chunk_handle': '202', 'port': None}
+            ]}
+        }, status_code=200)
+        m.get("http://127.0.0.1:50001/checksum", json={'crc32': zlib.crc32(fragments[0][3:]), 'length': len(fragments[0]) - 3})
+        m.get("http://127.0.0.1:50002/checksum", json={'crc32': zlib.crc32(fragments[1][:5]), 'length': 5})
+        size = len(fragments[0])
+        assert client.verify("/testfile.txt", 3, data[3:size + 5]) is True
+        assert m.request_history[-1].qs == {'chunk_handle': ['201'], 'offset': ['0'], 'length': ['5']}
+        assert client.verify("/testfile.txt", 3, b"X" + data[4:size + 5]) is False
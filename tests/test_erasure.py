@@ -0,0 +1,29 @@
+import pytest
+import sys
+import os
+import itertools
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from erasure import ReedSolomon
+
+def test_encode_is_systematic():
+    rs = ReedSolomon(4, 2)
+    data = b"Hello, GFS! Erasure coding."
+    fragments = rs.encode(data)
+    assert len(fragments) == 6
+    assert b''.join(fragments[:4])[:len(data)] == data
+
+def test_decode_survives_any_m_losses():
+    rs = ReedSolomon(4, 2)
+    data = os.urandom(1000)
+    fragments = rs.encode(data)
+    for lost in itertools.combinations(range(6), 2):
+        available = {i: f for i, f in enumerate(fragments) if i not in lost}
+        assert rs.decode(available, len(data)) == data
+
+def test_decode_with_too_few_fragments():
+    rs = ReedSolomon(4, 2)
+    fragments = rs.encode(b"abcdefgh")
+    with pytest.raises(ValueError):
+        rs.decode({0: fragments[0], 4: fragments[4], 5: fragments[5]}, 8)
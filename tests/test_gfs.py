@@ -0,0 +1,73 @@
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from gfs import Copy, Manifest
+import config
+
+def make_tree(root):
+    os.makedirs(os.path.join(root, "logs"))
+    contents = {
+        "empty.txt": b"",
+        "small.txt": b"hello",
+        "logs/big.bin": os.urandom(config.CHUNK_SIZE_BYTES * 2 + 100)
+    }
+    for name, data in contents.items():
+        with open(os.path.join(root, name), 'wb') as f:
+            f.write(data)
+    return contents
+
+def test_copy_tree_in_and_out(memory_client, tmp_path):
+    contents = make_tree(str(tmp_path / "src"))
+    copy = Copy(memory_client, Manifest(str(tmp_path / "in.json")), workers=4, retries=2)
+    assert copy.import_tree(str(tmp_path / "src"), "/data")
+    assert memory_client.get_file_info("/data/logs/big.bin") == {'length': len(contents["logs/big.bin"])}
+    assert len([w for w in memory_client.writes if w[0] == "/data/logs/big.bin"]) == 3
+
+    copy = Copy(memory_client, Manifest(str(tmp_path / "out.json")), workers=4, retries=2)
+    assert copy.export_tree("/data", str(tmp_path / "dst"))
+    for name, data in contents.items():
+        with open(os.path.join(tmp_path, "dst", *name.split('/')), 'rb') as f:
+            assert f.read() == data
+
+def test_resume_skips_copied_chunks(memory_client, tmp_path):
+    make_tree(str(tmp_path / "src"))
+    big = str(tmp_path / "src" / "logs" / "big.bin")
+    manifest = Manifest(str(tmp_path / "in.json"))
+    manifest.start("logs/big.bin", os.path.getsize(big), os.stat(big).st_mtime)
+    manifest.chunk_done("logs/big.bin", 0)
+    manifest.chunk_done("logs/big.bin", 1)
+    manifest.save()
+
+    assert Copy(memory_client, Manifest(str(tmp_path / "in.json")), workers=2, retries=2).import_tree(str(tmp_path / "src"), "/data")
+    assert [offset for name, offset, _ in memory_client.writes if name == "/data/logs/big.bin"] == [2 * config.CHUNK_SIZE_BYTES]
+
+def test_checksum_mismatch_fails_the_file(memory_client, tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'CLIENT_READ_TIMEOUT_SECONDS', 0)
+    make_tree(str(tmp_path / "src"))
+    memory_client.corrupt = True
+    copy = Copy(memory_client, Manifest(str(tmp_path / "in.json")), workers=2, retries=2)
+    assert not copy.import_tree(str(tmp_path / "src"), "/data")
+    assert "small.txt" in copy.failed
+    assert memory_client.get_file_info("/data/small.txt") == {'length': 0}
+
+def test_export_fails_when_chunks_cannot_be_verified(memory_client, tmp_path):
+    make_tree(str(tmp_path / "src"))
+    assert Copy(memory_client, Manifest(str(tmp_path / "in.json")), workers=2, retries=2).import_tree(str(tmp_path / "src"), "/data")
+    memory_client.unverifiable = True
+    copy = Copy(memory_client, Manifest(str(tmp_path / "out.json")), workers=2, retries=2)
+    assert not copy.export_tree("/data", str(tmp_path / "dst"))
+    assert "small.txt" in copy.failed and "empty.txt" not in copy.failed
+
+def test_export_rejects_names_that_escape_the_destination(memory_client, tmp_path):
+    for name in ["/data/ok.txt", "/data/../../escaped.txt", "/data//absolute.txt", "/data/a/./b.txt"]:
+        memory_client.create(name)
+        memory_client.write(name, b"data")
+        memory_client.update_file_length(name, 4)
+    copy = Copy(memory_client, Manifest(str(tmp_path / "out.json")), workers=2, retries=2)
+    assert not copy.export_tree("/data", str(tmp_path / "dst" / "inner"))
+    assert copy.failed == {"/data/../../escaped.txt", "/data//absolute.txt", "/data/a/./b.txt"}
+    assert os.listdir(tmp_path / "dst" / "inner") == ["ok.txt"]
+    assert not os.path.exists(tmp_path / "escaped.txt") and not os.path.exists(tmp_path / "dst" / "escaped.txt")
@@ -0,0 +1,85 @@
+import pytest
+import sys
+import os
+import csv
+import gzip
+import io
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from gfs_file import open_file
+import config
+
+def test_sequential_read_fetches_whole_chunks_ahead(memory_client):
+    data = bytes(range(256)) * (config.CHUNK_SIZE_BYTES * 3 // 256)
+    with memory_client.open("/blob", "wb") as f:
+        f.write(data)
+    assert all(offset % config.CHUNK_SIZE_BYTES == 0 and size == config.CHUNK_SIZE_BYTES for _, offset, size in memory_client.writes)
+    assert memory_client.files["/blob"]['length'] == len(data)
+
+    with memory_client.open("/blob", "rb") as f:
+        assert f.read(100) == data[:100]
+        assert f.read() == data[100:]
+    assert sorted(memory_client.reads) == [("/blob", i * config.CHUNK_SIZE_BYTES, config.CHUNK_SIZE_BYTES) for i in range(3)]
+
+def test_seek_and_tell_read_ranges(memory_client):
+    with memory_client.open("/blob", "wb") as f:
+        f.write(b"0123456789" * 10)
+    with memory_client.open("/blob", "rb") as f:
+        f.seek(-5, io.SEEK_END)
+        assert f.tell() == 95
+        assert f.read() == b"56789"
+        f.seek(10)
+        assert f.read(3) == b"012"
+
+def test_append_mode_and_text_mode(memory_client):
+    with memory_client.open("/people.csv", "w") as f:
+        csv.writer(f).writerow(["name", "city"])
+    with memory_client.open("/people.csv", "a") as f:
+        csv.writer(f).writerow(["Zoë", "Zürich"])
+    with memory_client.open("/people.csv", "r") as f:
+        assert list(csv.reader(f)) == [["name", "city"], ["Zoë", "Zürich"]]
+
+def test_gzip_round_trip(memory_client):
+    lines = b"".join(b"line %d\n" % i for i in range(50000))
+    with memory_client.open("/logs.gz", "wb") as f:
+        with gzip.GzipFile(fileobj=f, mode="wb") as gz:
+            gz.write(lines)
+    with memory_client.open("/logs.gz", "rb") as f:
+        with gzip.GzipFile(fileobj=f) as gz:
+            assert gz.read() == lines
+
+def test_missing_file_and_bad_mode(memory_client):
+    with pytest.raises(FileNotFoundError):
+        open_file(memory_client, "/missing", "rb")
+    with pytest.raises(ValueError):
+        open_file(memory_client, "/missing", "x")
+
+def test_concurrent_appenders_do_not_overwrite_each_other(memory_client):
+    first = memory_client.open("/log", "ab")
+    second = memory_client.open("/log", "ab")
+    first.write(b"first\n")
+    second.write(b"second\n")
+    first.close()
+    second.close()
+    with memory_client.open("/log", "rb") as f:
+        assert f.read() == b"first\nsecond\n"
+
+def test_only_record_append_padding_reads_as_zeros(memory_client):
+    memory_client.create("/log")
+    assert memory_client.record_append("/log", b"a" * 10) == 0
+    record = b"b" * (config.CHUNK_SIZE_BYTES - 5)
+    assert memory_client.record_append("/log", record) == config.CHUNK_SIZE_BYTES
+    memory_client.chunk_ends[0] = 10
+    with memory_client.open("/log", "rb") as f:
+        f.seek(5)
+        assert f.read(10) == b"aaaaa" + b"\0" * 5
+        f.seek(0)
+        assert f.read() == b"a" * 10 + b"\0" * (config.CHUNK_SIZE_BYTES - 10) + record
+
+    # The last chunk of the file ends early: its data is missing, not padding.
+    memory_client.chunk_ends[1] = 20
+    with memory_client.open("/log", "rb") as f:
+        f.seek(config.CHUNK_SIZE_BYTES)
+        with pytest.raises(OSError):
+            f.read()
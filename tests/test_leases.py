@@ -0,0 +1,31 @@
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from leases import LeaseTable
+
+def test_expire_returns_leases_in_expiry_order():
+    leases = LeaseTable()
+    leases.grant(1, "a", 30)
+    leases.grant(2, "b", 10)
+    leases.grant(3, "c", 20)
+    assert leases.expire(25) == [(2, "b"), (3, "c")]
+    assert leases.holder(1, 25) == "a"
+    assert len(leases) == 1
+
+def test_extended_lease_survives_its_old_expiry():
+    leases = LeaseTable()
+    leases.grant(1, "a", 10)
+    assert leases.extend(1, "a", 5, 70)
+    assert not leases.extend(1, "b", 5, 70)
+    assert leases.expire(60) == []
+    assert leases.holder(1, 60) == "a"
+    assert leases.expire(70) == [(1, "a")]
+
+def test_expired_lease_cannot_be_extended():
+    leases = LeaseTable()
+    leases.grant(1, "a", 10)
+    assert not leases.extend(1, "a", 11, 70)
+    assert leases.holder(1, 11) is None
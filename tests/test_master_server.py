@@ -1,22 +1,18 @@
 import pytest
+import requests_mock
 import sys
 import os
 import time
+import json
+import base64
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from master_server import GFSMaster
+from master_server import GFSMaster, app
+import compression
+from erasure import ReedSolomon
 import config
 
-@pytest.fixture
-def master():
-    # Clean up metadata before each test
-    if os.path.exists(config.METADATA_STORE):
-        os.remove(config.METADATA_STORE)
-    if os.path.exists(config.OPERATION_LOG):
-        os.remove(config.OPERATION_LOG)
-    return GFSMaster()
-
 def test_create_file(master):
     assert master.create_file("/testfile.txt") is not None
     assert "/testfile.txt" in master.files
@@ -53,11 +49,200 @@ def test_get_chunk_locations(master):
 
 def test_get_file_info(master):
     master.create_file("/testfile.txt")
-    master.files["/testfile.txt"]['length'] = 100 # Manually set length for testing
+    master.files["/testfile.txt"].length = 100 # Manually set length for testing
     info = master.get_file_info("/testfile.txt")
     assert info == {'length': 100}
 
 def test_update_file_length(master):
     master.create_file("/testfile.txt")
     master.update_file_length("/testfile.txt", 200)
-    assert master.files["/testfile.txt"]['length'] == 200
+    assert master.files["/testfile.txt"].length == 200
+
+def test_convert_cold_file_to_erasure_coding(master):
+    for port in range(50001, 50007):
+        master.register_chunk_server(port, f"/data/chunk{port}")
+    master.create_file("/cold.txt", storage_class='erasure')
+    chunk_handle = master.allocate_chunk("/cold.txt", '0')['chunk_handle']
+    master.files["/cold.txt"].length = config.CHUNK_SIZE_BYTES
+    master.files["/cold.txt"].mtime = time.time() - config.COLD_FILE_AGE_SECONDS - 1
+    assert master.convert_cold_files() == 0  # still leased to a writer
+    master.leases.revoke(chunk_handle)
+    source_port = master.chunk_servers[master.chunks.replicas(chunk_handle)[0]]['port']
+
+    with requests_mock.Mocker() as m:
+        m.get(f"http://127.0.0.1:{source_port}/read", json={'data': base64.b64encode(b"cold data").decode('ascii')})
+        for port in range(50001, 50007):
+            m.post(f"http://127.0.0.1:{port}/write", status_code=200)
+        assert master.convert_cold_files() == 1
+        fragments = {int(r.json()['chunk_handle']): base64.b64decode(r.json()['data']) for r in m.request_history if r.method == 'POST'}
+
+    layout = master.chunks.erasure[chunk_handle]
+    assert master.chunks.replicas(chunk_handle) == []
+    locations = master.get_chunk_locations("/cold.txt", 0)
+    assert len(locations['erasure']['fragments']) == config.ERASURE_DATA_FRAGMENTS + config.ERASURE_PARITY_FRAGMENTS
+    ordered = [fragments[int(handle)] for handle, _ in layout['fragments']]
+    rs = ReedSolomon(layout['k'], layout['m'])
+    assert rs.decode({i: f for i, f in enumerate(ordered) if i >= 2}, layout['length']) == b"cold data"
+
+def test_checkpoint_round_trip(master):
+    master.register_chunk_server(50001, "/data/chunk1")
+    master.create_file("/testfile.txt", codec='zlib')
+    master.allocate_chunk("/testfile.txt", 0)
+    master.allocate_chunk("/testfile.txt", 3)
+    # Nothing above writes a checkpoint; the restart replays the operation log.
+    assert not os.path.exists(config.METADATA_STORE)
+    master.save_metadata()
+    master.update_file_length("/testfile.txt", 300)
+
+    restarted = GFSMaster()
+    record = restarted.files["/testfile.txt"]
+    assert record.length == 300
+    assert record.codec == 'zlib'
+    assert record.chunk_handles() == master.files["/testfile.txt"].chunk_handles()
+    assert record.chunk_handle(1) is None
+    assert restarted.chunks.replicas(record.chunk_handle(3)) == ["127.0.0.1:50001"]
+
+def test_load_legacy_json_metadata(master):
+    with open(config.METADATA_STORE, 'w') as f:
+        json.dump({
+            'files': {'old.txt': {'length': 47, 'chunks': {'0': '1'}}},
+            'chunks': {'0': {'replicas': ['127.0.0.1:50054'], 'version': 0},
+                       '1': {'replicas': ['127.0.0.1:50053'], 'version': 2}},
+            'file_to_chunks': {'old.txt': ['1']},
+            'next_chunk_handle': 2
+        }, f)
+    restarted = GFSMaster()
+    assert restarted.get_file_info('old.txt') == {'length': 47}
+    assert restarted.files['old.txt'].chunk_handle(0) == 1
+    assert restarted.chunks.version(1) == 2
+    assert len(restarted.chunks) == 2
+
+def test_heartbeat_extends_lease_and_reports_version(master):
+    server_id = master.register_chunk_server(50001, "/data/chunk1", host="127.0.0.1")
+    master.create_file("/leased.txt")
+    chunk_handle = master.allocate_chunk("/leased.txt", 0)['chunk_handle']
+    assert master.chunks.version(chunk_handle) == 1
+    expiry = master.leases.expiry(chunk_handle)
+
+    time.sleep(0.01)
+    response = master.handle_heartbeat(server_id, {str(chunk_handle): 0}, [chunk_handle])
+    assert response['versions'] == {str(chunk_handle): 1}
+    assert str(chunk_handle) in response['leases']
+    assert response['stale'] == []
+    assert master.leases.expiry(chunk_handle) > expiry
+
+def test_heartbeat_detects_stale_replica(master):
+    first = master.register_chunk_server(50001, "/data/chunk1", host="127.0.0.1")
+    second = master.register_chunk_server(50002, "/data/chunk2", host="127.0.0.1")
+    master.create_file("/stale.txt")
+    config.REPLICATION_FACTOR, replication = 2, config.REPLICATION_FACTOR
+    try:
+        chunk_handle = master.allocate_chunk("/stale.txt", 0)['chunk_handle']
+    finally:
+        config.REPLICATION_FACTOR = replication
+    master.handle_heartbeat(first, {str(chunk_handle): 1})
+    master.handle_heartbeat(second, {str(chunk_handle): 1})
+
+    # The second server misses the version bump of a new lease.
+    master.leases.revoke(chunk_handle)
+    del master.chunk_servers[second]
+    master.get_chunk_locations("/stale.txt", 0)
+    master.register_chunk_server(50002, "/data/chunk2", host="127.0.0.1")
+
+    assert master.handle_heartbeat(second, {str(chunk_handle): 1})['stale'] == [chunk_handle]
+    assert master.chunks.replicas(chunk_handle) == [first]
+    assert (second, chunk_handle) in master.pending_deletes
+
+def test_unconfirmed_version_is_resent_not_stale(master):
+    server_id = master.register_chunk_server(50001, "/data/chunk1", host="127.0.0.1")
+    master.create_file("/lost.txt")
+    chunk_handle = master.allocate_chunk("/lost.txt", 0)['chunk_handle']
+
+    # The first response carrying the new version is lost; the replica still reports 0.
+    master.handle_heartbeat(server_id, {str(chunk_handle): 0})
+    response = master.handle_heartbeat(server_id, {str(chunk_handle): 0})
+    assert response['stale'] == [] and response['versions'] == {str(chunk_handle): 1}
+    assert master.chunks.replicas(chunk_handle) == [server_id]
+
+    response = master.handle_heartbeat(server_id, {str(chunk_handle): 1})
+    assert response['versions'] == {}
+    assert master.chunks.pending_versions == {}
+
+def test_last_live_replica_is_never_deleted(master):
+    server_id = master.register_chunk_server(50001, "/data/chunk1", host="127.0.0.1")
+    master.create_file("/only.txt")
+    chunk_handle = master.allocate_chunk("/only.txt", 0)['chunk_handle']
+    master.chunks.pending_versions.clear()
+
+    response = master.handle_heartbeat(server_id, {str(chunk_handle): 0})
+    assert response['stale'] == []
+    assert master.chunks.replicas(chunk_handle) == [server_id]
+    assert master.pending_deletes == []
+    assert response['versions'] == {str(chunk_handle): 1}
+
+def test_mutation_lookup_marks_file_modified(master):
+    master.register_chunk_server(50001, "/data/chunk1", host="127.0.0.1")
+    master.create_file("/hot.txt", storage_class='erasure')
+    chunk_handle = master.allocate_chunk("/hot.txt", 0)['chunk_handle']
+    master.leases.revoke(chunk_handle)
+    master.files["/hot.txt"].mtime = 0
+    master.get_chunk_locations("/hot.txt", 0, mutation=False)
+    assert master.files["/hot.txt"].mtime == 0
+    master.get_chunk_locations("/hot.txt", 0, mutation=True)
+    assert master.files["/hot.txt"].mtime > 0
+
+def test_heartbeat_schedules_orphaned_replicas(master):
+    server_id = master.register_chunk_server(50001, "/data/chunk1", host="127.0.0.1")
+    master.create_file("/kept.txt")
+    chunk_handle = master.allocate_chunk("/kept.txt", 0)['chunk_handle']
+    master.handle_heartbeat(server_id, {str(chunk_handle): 1, str(chunk_handle + 5): 1, "local_name": 1})
+    assert master.pending_deletes == [(server_id, chunk_handle + 5)]
+
+def test_restart_replays_operations_logged_after_checkpoint(master):
+    first = master.register_chunk_server(50001, "/data/chunk1", host="127.0.0.1")
+    second = master.register_chunk_server(50002, "/data/chunk2", host="127.0.0.1")
+    master.create_file("/logged.txt")
+    config.REPLICATION_FACTOR, replication = 2, config.REPLICATION_FACTOR
+    try:
+        chunk_handle = master.allocate_chunk("/logged.txt", 0)['chunk_handle']
+    finally:
+        config.REPLICATION_FACTOR = replication
+    master.save_metadata()
+    with open(config.METADATA_STORE, 'rb') as f:
+        checkpoint = f.read()
+    master.handle_heartbeat(first, {str(chunk_handle): 1})
+    master.handle_heartbeat(second, {str(chunk_handle): 1})
+    master.leases.revoke(chunk_handle)
+    del master.chunk_servers[second]
+    master.get_chunk_locations("/logged.txt", 0)
+    master.register_chunk_server(50002, "/data/chunk2", host="127.0.0.1")
+    assert master.handle_heartbeat(second, {str(chunk_handle): 1})['stale'] == [chunk_handle]
+    # Neither the lease grant nor the stale replica wrote a checkpoint.
+    with open(config.METADATA_STORE, 'rb') as f:
+        assert f.read() == checkpoint
+
+    restarted = GFSMaster()
+    assert restarted.chunks.version(chunk_handle) == 2
+    assert restarted.chunks.replicas(chunk_handle) == [first]
+    assert restarted.chunks.pending_versions == {chunk_handle: {first: 2}}
+
+def test_last_partial_chunk_of_cold_file_stays_replicated(master):
+    for port in range(50001, 50007):
+        master.register_chunk_server(port, f"/data/chunk{port}")
+    master.create_file("/cold.log", storage_class='erasure')
+    for chunk_index in range(2):
+        master.leases.revoke(master.allocate_chunk("/cold.log", chunk_index)['chunk_handle'])
+    master.files["/cold.log"].length = config.CHUNK_SIZE_BYTES + 10
+    master.files["/cold.log"].mtime = time.time() - config.COLD_FILE_AGE_SECONDS - 1
+    encoded = []
+    master.encode_chunk = lambda filename, chunk_handle: encoded.append(chunk_handle) or True
+    assert master.convert_cold_files() == 1
+    assert encoded == [master.files["/cold.log"].chunk_handle(0)]
+
+def test_create_route_accepts_every_known_codec(master, monkeypatch):
+    monkeypatch.setitem(compression.CODECS, 'identity', (bytes, bytes))
+    http = app.test_client()
+    prefix = f"/route-{time.time()}"
+    assert http.post('/create', json={'filename': f"{prefix}-bogus.txt", 'codec': 'bogus'}).status_code == 400
+    for codec in (None, 'zlib', 'identity'):
+        assert http.post('/create', json={'filename': f"{prefix}-{codec}.txt", 'codec': codec}).status_code == 200
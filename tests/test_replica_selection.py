@@ -0,0 +1,34 @@
+import pytest
+import sys
+import os
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from replica_selection import ReplicaSelector
+import config
+
+def test_order_prefers_fast_idle_replicas():
+    selector = ReplicaSelector(alpha=0.5)
+    selector.record(1, 0.010)
+    selector.record(2, 0.004)
+    selector.record(3, 0.002)
+    selector.report_load(3, 6)
+    assert selector.order([1, 2, 3, 4]) == [4, 2, 1, 3]
+
+    selector.record(2, 0.020)
+    assert selector.latency[2] == pytest.approx(0.012)
+    assert selector.order([1, 2]) == [1, 2]
+
+def test_hedge_delay_follows_latency_percentile():
+    selector = ReplicaSelector(percentile=90)
+    assert selector.hedge_delay() == config.CLIENT_HEDGE_INITIAL_DELAY_SECONDS
+    for i in range(100):
+        selector.record(1, i / 1000)
+    assert selector.hedge_delay() == pytest.approx(0.090)
+
+def test_older_load_sample_does_not_override_newer():
+    selector = ReplicaSelector()
+    selector.report_load(1, 7)
+    selector.report_load(1, 0, measured_at=time.time() - 60)
+    assert selector.load[1] == 7
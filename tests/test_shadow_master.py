@@ -0,0 +1,53 @@
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from shadow_master import GFSShadowMaster
+import config
+
+def test_shadow_replays_operation_log(master):
+    master.register_chunk_server(50001, "/data/chunk1")
+    master.create_file("/testfile.txt")
+    chunk_handle = master.allocate_chunk("/testfile.txt", 0)['chunk_handle']
+    master.update_file_length("/testfile.txt", 42)
+
+    shadow = GFSShadowMaster()
+    assert shadow.get_file_info("/testfile.txt") == {'length': 42}
+    assert shadow.ls("/") == ["/testfile.txt"]
+    locations = shadow.get_chunk_locations("/testfile.txt", 0)
+    assert locations['chunk_handle'] == chunk_handle
+    assert locations['locations'] == [50001]
+
+def test_shadow_tails_new_operations(master):
+    shadow = GFSShadowMaster()
+    assert shadow.get_file_info("/later.txt") is None
+
+    master.create_file("/later.txt")
+    master.update_file_length("/later.txt", 7)
+    assert shadow.poll_operation_log() == 2
+    assert shadow.get_file_info("/later.txt") == {'length': 7}
+    assert shadow.get_chunk_locations("/later.txt", 0) is None
+
+def test_shadow_starts_tailing_at_checkpoint_offset(master):
+    master.create_file("/testfile.txt")
+    master.update_file_length("/testfile.txt", 42)
+
+    shadow = GFSShadowMaster()
+    assert shadow.log_offset == os.path.getsize(config.OPERATION_LOG)
+    assert shadow.get_file_info("/testfile.txt") == {'length': 42}
+    assert shadow.poll_operation_log() == 0
+
+def test_shadow_and_master_agree_on_erasure_coded_locations(master):
+    for port in (50001, 50002, 50003):
+        master.register_chunk_server(port, f"/data/chunk{port}")
+    master.create_file("/cold.txt", storage_class='erasure')
+    chunk_handle = master.allocate_chunk("/cold.txt", 0)['chunk_handle']
+    fragments = [master.chunks.allocate([f"127.0.0.1:{port}"]) for port in (50001, 50002, 50003)]
+    layout = {'k': 2, 'm': 1, 'length': 9, 'fragments': [[h, f"127.0.0.1:{50001 + i}"] for i, h in enumerate(fragments)]}
+    master.chunks.erasure[chunk_handle] = layout
+    master.log_operation('erasure_encode_chunk', chunk_handle=chunk_handle, erasure=layout)
+
+    shadow = GFSShadowMaster()
+    assert shadow.get_chunk_locations("/cold.txt", 0) == master.get_chunk_locations("/cold.txt", 0, mutation=False)